@@ -1,16 +1,26 @@
+import asyncio
 import logging
+from contextlib import suppress
 import os
 import json
-from aiogram import Router, types
+import re
+from html import escape
+from aiogram import Router, types, F
+from aiogram.dispatcher.event.handler import CallableObject
 from aiogram.filters import CommandStart, Command
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove, WebAppInfo
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, WebAppInfo
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime, timedelta
+from datetime import date
+from functools import lru_cache, partial
 from bot.messages import Messages
 from bot.config import Config
 from bot.services.notification_scheduler import NotificationScheduler
 
+logger = logging.getLogger(__name__)
+
 # FSM States for notification setup
 class NotificationStates(StatesGroup):
     waiting_for_timezone_location = State()
@@ -18,11 +28,28 @@ class NotificationStates(StatesGroup):
 
 async def safe_callback_answer(callback_query: types.CallbackQuery, text: str = None):
     """Safely answer callback query, ignoring timeout errors"""
+    # Ignore callback answer timeouts and other errors
+    with suppress(Exception):
+        await callback_query.answer(text)
+
+async def _report_callback_error(callback_query: types.CallbackQuery, text: str):
+    """Tell the user a callback failed: as a toast while the query is unanswered, otherwise in the chat"""
     try:
         await callback_query.answer(text)
     except Exception:
-        # Ignore callback answer timeouts and other errors
-        pass
+        with suppress(Exception):
+            await callback_query.message.answer(text)
+
+async def _as_coroutine(method):
+    """Await an aiogram method call inside a coroutine; asyncio.gather can't take the method object itself"""
+    return await method
+
+# Booking callback data: day is a date ordinal, slot indexes BOOKING_TIME_SLOTS (-1 while picking a date)
+class BookCB(CallbackData, prefix="b"):
+    day: int
+    slot: int = -1
+
+BOOKING_TIME_SLOTS = ("10:00", "14:00", "16:00")
 
 # States for FSM
 class UserState(StatesGroup):
@@ -33,28 +60,144 @@ class UserState(StatesGroup):
 start_router = Router()
 content_router = Router()
 
+# Dispatch table for callbacks: exact data -> handler, plus first "_" token of the data -> (prefix, handler) pairs, longest prefix first
+_CALLBACK_EXACT_ROUTES: dict[str, CallableObject] = {}
+_CALLBACK_PREFIX_ROUTES: dict[str, tuple[tuple[str, CallableObject], ...]] = {}
+
+def callback_route(*values: str):
+    """Register a callback handler for the exact data values in the dispatch table"""
+    def decorator(handler):
+        route = CallableObject(handler)
+        for value in values:
+            if value in _CALLBACK_EXACT_ROUTES:
+                raise RuntimeError(
+                    f"Callback data '{value}' is already routed to {_CALLBACK_EXACT_ROUTES[value].callback.__qualname__}"
+                )
+            _CALLBACK_EXACT_ROUTES[value] = route
+        return handler
+    return decorator
+
+def callback_prefix(prefix: str):
+    """Register a callback handler for data starting with prefix in the dispatch table"""
+    def decorator(handler):
+        head = prefix.partition('_')[0]
+        routes = _CALLBACK_PREFIX_ROUTES.get(head, ())
+        for registered, route in routes:
+            if registered == prefix:
+                raise RuntimeError(f"Callback prefix '{prefix}' is already routed to {route.callback.__qualname__}")
+        routes += ((prefix, CallableObject(handler)),)
+        _CALLBACK_PREFIX_ROUTES[head] = tuple(sorted(routes, key=lambda route: len(route[0]), reverse=True))
+        return handler
+    return decorator
+
+def _resolve_callback_route(callback_query: types.CallbackQuery):
+    """Filter: pick the route with a dict lookup, passing the data after a matched prefix as payload"""
+    data = callback_query.data
+    if not data:
+        return False
+    handler = _CALLBACK_EXACT_ROUTES.get(data)
+    if handler is not None:
+        return {'route_handler': handler, 'payload': ''}
+    for prefix, handler in _CALLBACK_PREFIX_ROUTES.get(data.partition('_')[0], ()):
+        if data.startswith(prefix):
+            return {'route_handler': handler, 'payload': data[len(prefix):]}
+    return False
+
+@content_router.callback_query(_resolve_callback_route)
+async def dispatch_callback(callback_query: types.CallbackQuery, route_handler: CallableObject, **kwargs):
+    """Single entrypoint for all table-routed callbacks"""
+    await route_handler.call(callback_query, **kwargs)
+
+# Config and message values are fixed for the process lifetime
+_WELCOME = Messages.START_CMD["welcome"]
+_ABOUT_MSG = Messages.ABOUT_MESSAGE
+_ADMIN_ID = Config.TELEGRAM_ADMIN_ID
+_WEBAPP_URL = Config.WEBAPP_URL
+
+# Web app entry points shared by every keyboard that opens them
+_WEBAPP_INFO_ROOT = WebAppInfo(url=_WEBAPP_URL)
+_WEBAPP_INFO_VIDEOS = WebAppInfo(url=f"{_WEBAPP_URL}/videos")
+_WEBAPP_INFO_TEXTS = WebAppInfo(url=f"{_WEBAPP_URL}/texts")
+_WEBAPP_INFO_PODCASTS = WebAppInfo(url=f"{_WEBAPP_URL}/podcasts")
+
+# Static keyboards - they depend only on Config, so build them once at import
+_MATERIALS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📚 Все материалы", web_app=_WEBAPP_INFO_ROOT)],
+    [InlineKeyboardButton(text="🎥 Видео эфиры", web_app=_WEBAPP_INFO_VIDEOS)],
+    #[InlineKeyboardButton(text="🎙️ Подкасты", web_app=_WEBAPP_INFO_PODCASTS)],
+    [InlineKeyboardButton(text="📄 Статьи", web_app=_WEBAPP_INFO_TEXTS)]
+])
+
+_QUIZ_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🎯 Начать квиз", callback_data="start_quiz")],
+    [InlineKeyboardButton(text="📊 Мои результаты", callback_data="quiz_results")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_settings")]
+])
+
+_NOTIFS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📅 Каждый день", callback_data="notif_freq_daily")],
+    [InlineKeyboardButton(text="💼 Только рабочие дни", callback_data="notif_freq_weekdays")],
+    [InlineKeyboardButton(text="🏖️ Только выходные", callback_data="notif_freq_weekends")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_settings")]
+])
+
+_WEBAPP_KB_WEB_APP = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🌐 Открыть Web App", web_app=_WEBAPP_INFO_ROOT)]
+])
+_WEBAPP_KB_VIDEOS = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🎥 Открыть видео", web_app=_WEBAPP_INFO_VIDEOS)]
+])
+_WEBAPP_KB_TEXTS = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📝 Открыть тексты", web_app=_WEBAPP_INFO_TEXTS)]
+])
+_WEBAPP_KB_PODCASTS = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🎧 Открыть подкасты", web_app=_WEBAPP_INFO_PODCASTS)]
+])
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_bg_tasks = set()
+
+def _run_in_background(coro):
+    """Schedule a coroutine without awaiting it, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+async def _safe_create_user(supabase_client, user: types.User):
+    """Register user in Supabase, logging instead of raising on failure"""
+    try:
+        await supabase_client.create_user(
+            telegram_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+    except Exception as e:
+        logger.warning("User registration error: %s", e)
+
+async def _log_failed_write(write, telegram_id: int):
+    """Await a user update the reply did not wait for, logging when it did not go through"""
+    try:
+        if await write is None:
+            logger.error("Background settings update failed for user %s", telegram_id)
+    except Exception as e:
+        logger.error("Background settings update failed for user %s: %s", telegram_id, e)
+
 @start_router.message(CommandStart())
 async def cmd_start(message: types.Message, supabase_client):
     """Start command handler"""
     user_name = message.from_user.first_name
-    await message.answer(Messages.START_CMD["welcome"](user_name))
+    await message.answer(_WELCOME(user_name))
     
-    try:
-        # Register user in Supabase
-        await supabase_client.create_user(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
-        )
-    except Exception as e:
-        logging.warning(f"User registration error: {e}")
+    # Register user in Supabase without holding up the handler
+    _run_in_background(_safe_create_user(supabase_client, message.from_user))
 
 @start_router.message(Command("about"))
 async def about(message: types.Message):
     """About command handler"""
     await message.answer(
-        Messages.ABOUT_MESSAGE,
+        _ABOUT_MSG,
         parse_mode="Markdown"
     )
 
@@ -62,25 +205,16 @@ async def about(message: types.Message):
 async def list_materials(message: types.Message):
     """Open webapp with all materials and category buttons"""
     try:
-        # Create inline keyboard with category buttons
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📚 Все материалы", web_app=WebAppInfo(url=f"{Config.WEBAPP_URL}"))],
-            [InlineKeyboardButton(text="🎥 Видео эфиры", web_app=WebAppInfo(url=f"{Config.WEBAPP_URL}/videos"))],
-            #[InlineKeyboardButton(text="🎙️ Подкасты", web_app=WebAppInfo(url=f"{Config.WEBAPP_URL}/podcasts"))],
-            [InlineKeyboardButton(text="📄 Статьи", web_app=WebAppInfo(url=f"{Config.WEBAPP_URL}/texts"))]
-        ])
-        
         # Log the webapp access
-        print(f"📚 Materials command: User {message.from_user.id} ({message.from_user.username}) accessing materials webapp")
-        logging.info(f"Materials command: User {message.from_user.id} accessing materials webapp")
+        logger.info("Materials command: User %s accessing materials webapp", message.from_user.id)
         
         await message.answer(
             "📚 Здесь вы можете изучить все материалы. Выберите категорию:",
-            reply_markup=keyboard,
+            reply_markup=_MATERIALS_KB,
             parse_mode="Markdown"
         )
     except Exception as e:
-        logging.error(f"Error in list_materials: {e}")
+        logger.error("Error in list_materials: %s", e)
         await message.answer("Ошибка при загрузке материалов.")
 
 @content_router.message(Command('quiz'))
@@ -89,78 +223,85 @@ async def quiz_command(message: types.Message):
     try:
         await show_quiz_topics(message, page=0)
     except Exception as e:
-        logging.error(f"Error in quiz_command: {e}")
+        logger.error("Error in quiz_command: %s", e)
         await message.answer("Ошибка при загрузке квиза.")
 
-async def show_quiz_topics(message: types.Message, page: int = 0, edit_message: bool = False):
-    """Show quiz topics with pagination"""
-    try:
-        # Load topics from video_descriptions.json
-        config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'video_descriptions.json')
-        if not os.path.exists(config_path):
-            await message.answer("Ошибка: файл с темами не найден.")
-            return
-            
-        with open(config_path, 'r', encoding='utf-8') as f:
-            video_data = json.load(f)
-        
-        topics = video_data.get('videos', {})
-        if not topics:
-            await message.answer("Ошибка: темы не найдены.")
-            return
-        
-        # Exclude "Жить или выживать: разбор" from quiz list
-        filtered_topics = {k: v for k, v in topics.items() if v['name'] != "Жить или выживать: разбор"}
-        topic_items = list(filtered_topics.items())
-        topics_per_page = 5
-        total_pages = (len(topic_items) + topics_per_page - 1) // topics_per_page
-        
-        # Ensure page is within bounds
-        page = max(0, min(page, total_pages - 1))
-        
-        # Get topics for current page
-        start_idx = page * topics_per_page
-        end_idx = start_idx + topics_per_page
-        current_topics = topic_items[start_idx:end_idx]
-        
-        # Create inline buttons for topics (one per row)
-        buttons = []
-        for topic_key, topic_info in current_topics:
-            button = InlineKeyboardButton(
-                text=f"📝 {topic_info['name']}",
-                web_app=WebAppInfo(url=f"{Config.WEBAPP_URL}/api/quiz-html/{topic_info['file_id']}")
-            )
-            buttons.append([button])
+# Quiz pages (text + keyboard) built from video_descriptions.json, rebuilt only when the file changes
+_QUIZ_TOPICS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'configs', 'video_descriptions.json'))
+_QUIZ_TOPICS_PER_PAGE = 5
+_QUIZ_EXCLUDED_TOPIC = "Жить или выживать: разбор"
+_quiz_pages: tuple[tuple[str, InlineKeyboardMarkup], ...] | None = None
+_topics_mtime: float = 0
+
+def _build_quiz_pages(topic_items: list[tuple[str, str]]) -> tuple[tuple[str, InlineKeyboardMarkup], ...]:
+    """Build the paginated quiz pages: header text and topic buttons (one per row) plus navigation"""
+    total_pages = (len(topic_items) + _QUIZ_TOPICS_PER_PAGE - 1) // _QUIZ_TOPICS_PER_PAGE
+    pages = []
+    for page in range(total_pages):
+        start_idx = page * _QUIZ_TOPICS_PER_PAGE
+        buttons = [
+            [InlineKeyboardButton(
+                text=f"📝 {name}",
+                web_app=WebAppInfo(url=f"{_WEBAPP_URL}/api/quiz-html/{file_id}")
+            )]
+            for name, file_id in topic_items[start_idx:start_idx + _QUIZ_TOPICS_PER_PAGE]
+        ]
         
         # Add navigation buttons if needed
         nav_buttons = []
         if page > 0:
-            nav_buttons.append(InlineKeyboardButton(
-                text="⬅️ Назад",
-                callback_data=f"quiz_page_{page-1}"
-            ))
-        
+            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"quiz_page_{page-1}"))
         if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(
-                text="Далее ➡️",
-                callback_data=f"quiz_page_{page+1}"
-            ))
-        
+            nav_buttons.append(InlineKeyboardButton(text="Далее ➡️", callback_data=f"quiz_page_{page+1}"))
         if nav_buttons:
             buttons.append(nav_buttons)
         
-        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-        
-        # Log quiz access
-        if not edit_message:
-            print(f"📝 Quiz command: User {message.from_user.id} ({message.from_user.username}) accessing quiz topics")
-            logging.info(f"Quiz command: User {message.from_user.id} accessing quiz topics")
-        
         text = (
             f"📝 *Выберите тему для квиза:*\n\n"
             f"Пройдите тест по одной из психологических тем эфиров\n\n"
             f"Страница {page + 1} из {total_pages}"
         )
+        pages.append((text, InlineKeyboardMarkup(inline_keyboard=buttons)))
+    return tuple(pages)
+
+def _load_quiz_pages() -> tuple[tuple[str, InlineKeyboardMarkup], ...] | None:
+    """Return cached quiz pages, or None if the topics file is missing"""
+    global _quiz_pages, _topics_mtime
+    try:
+        mtime = os.stat(_QUIZ_TOPICS_PATH).st_mtime
+    except FileNotFoundError:
+        return None
+    if _quiz_pages is None or mtime != _topics_mtime:
+        with open(_QUIZ_TOPICS_PATH, 'r', encoding='utf-8') as f:
+            topics = json.load(f).get('videos', {})
+        # Keep only (name, file_id) in one pass, skipping the topic that has no quiz
+        topic_items = [(v['name'], v['file_id']) for v in topics.values() if v['name'] != _QUIZ_EXCLUDED_TOPIC]
+        _quiz_pages = _build_quiz_pages(topic_items)
+        _topics_mtime = mtime
+    return _quiz_pages
+
+# Build the pages at startup so the first /quiz doesn't pay for it; a broken file is reported by show_quiz_topics
+with suppress(Exception):
+    _load_quiz_pages()
+
+async def show_quiz_topics(message: types.Message, page: int = 0, edit_message: bool = False):
+    """Show quiz topics with pagination"""
+    try:
+        pages = _load_quiz_pages()
+        if pages is None:
+            await message.answer("Ошибка: файл с темами не найден.")
+            return
+        if not pages:
+            await message.answer("Ошибка: темы не найдены.")
+            return
+        
+        # Ensure page is within bounds
+        page = max(0, min(page, len(pages) - 1))
+        text, keyboard = pages[page]
+        
+        # Log quiz access
+        if not edit_message:
+            logger.info("Quiz command: User %s accessing quiz topics", message.from_user.id)
         
         if edit_message:
             await message.edit_text(
@@ -176,61 +317,68 @@ async def show_quiz_topics(message: types.Message, page: int = 0, edit_message:
             )
         
     except Exception as e:
-        logging.error(f"Error in show_quiz_topics: {e}")
+        logger.error("Error in show_quiz_topics: %s", e)
         if edit_message:
             await message.edit_text("Ошибка при загрузке квиза.")
         else:
             await message.answer("Ошибка при загрузке квиза.")
 
+# Booking date keyboard for the current day, keyed by date ordinal
+_booking_cache: dict[int, InlineKeyboardMarkup] = {}
+
+@lru_cache(maxsize=16)
+def _slot_keyboard(day: int) -> InlineKeyboardMarkup:
+    """Time slot keyboard for a booking day (date ordinal); only the week ahead is ever requested"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"🕐 {slot}", callback_data=BookCB(day=day, slot=i).pack())] 
+        for i, slot in enumerate(BOOKING_TIME_SLOTS)
+    ])
+
 @content_router.message(Command('booking'))
 async def schedule_command(message: types.Message):
     """Handle booking command"""
-    # Create available dates for next 7 days
-    dates = [(datetime.now() + timedelta(days=x)).strftime("%Y-%m-%d") for x in range(1, 8)]
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"📅 {date}", callback_data=f"date_{date}")] 
-        for date in dates
-    ])
+    # The date list only changes once a day, so reuse today's keyboard
+    today_ord = date.today().toordinal()
+    keyboard = _booking_cache.get(today_ord)
+    if keyboard is None:
+        # Create available dates for next 7 days (as date ordinals)
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"📅 {date.fromordinal(day).isoformat()}", callback_data=BookCB(day=day).pack())] 
+            for day in range(today_ord + 1, today_ord + 8)
+        ])
+        _booking_cache.clear()
+        _booking_cache[today_ord] = keyboard
     
     await message.answer("Выберите дату сессии:", reply_markup=keyboard)
 
-@content_router.callback_query(lambda c: c.data.startswith('date_'))
-async def process_date_selection(callback_query: types.CallbackQuery):
+@content_router.callback_query(BookCB.filter(F.slot == -1))
+async def process_date_selection(callback_query: types.CallbackQuery, callback_data: BookCB):
     """Handle date selection for booking"""
-    selected_date = callback_query.data.replace('date_', '')
-    time_slots = ["10:00", "14:00", "16:00"]
+    selected_date = date.fromordinal(callback_data.day).isoformat()
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"🕐 {slot}", callback_data=f"slot_{selected_date}_{slot}")] 
-        for slot in time_slots
-    ])
-    
-    await callback_query.message.edit_text(
-        f"Дата: {selected_date}\nВыберите удобное время:",
-        reply_markup=keyboard
+    await asyncio.gather(
+        safe_callback_answer(callback_query),
+        _as_coroutine(callback_query.message.edit_text(
+            f"Дата: {selected_date}\nВыберите удобное время:",
+            reply_markup=_slot_keyboard(callback_data.day)
+        ))
     )
 
-@content_router.callback_query(lambda c: c.data.startswith('slot_'))
-async def process_slot_selection(callback_query: types.CallbackQuery, supabase_client):
+@content_router.callback_query(BookCB.filter(F.slot >= 0))
+async def process_slot_selection(callback_query: types.CallbackQuery, callback_data: BookCB):
     """Handle time slot selection for booking"""
-    try:
-        _, date, time = callback_query.data.split('_', 2)
-        
-        user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
-        if user:
-            # Here you would save the booking to your database
-            # For now, just confirm the booking
-            await callback_query.message.edit_text(
-                f"✅ Ваша сессия на {date} в {time} подтверждена!\n\n"
-                "В назначенное время мы Вас ждем."
-            )
-        else:
-            await callback_query.message.edit_text("Ошибка: пользователь не найден.")
-            
-    except Exception as e:
-        logging.error(f"Error processing slot selection: {e}")
-        await callback_query.message.edit_text("Произошла ошибка при бронировании.")
+    booking_date = date.fromordinal(callback_data.day).isoformat()
+    booking_time = BOOKING_TIME_SLOTS[callback_data.slot]
+    
+    # Here you would save the booking to your database, keyed by callback_query.from_user.id
+    # (an upsert returning the row also tells whether the user exists). For now, just confirm the booking
+    await asyncio.gather(
+        safe_callback_answer(callback_query),
+        _as_coroutine(callback_query.message.edit_text(
+            f"✅ Ваша сессия на {booking_date} в {booking_time} подтверждена!\n\n"
+            "В назначенное время мы Вас ждем."
+        ))
+    )
 
 @content_router.message(Command('subscribe'))
 async def subscribe_command(message: types.Message):
@@ -241,51 +389,51 @@ async def subscribe_command(message: types.Message):
         parse_mode="HTML"
     )
 
+def _build_settings_view(is_audio: bool, notification: bool) -> tuple[str, InlineKeyboardMarkup]:
+    """Build the settings menu text and keyboard for one (isAudio, notification) combination"""
+    audio_status = "🔊 Аудио" if is_audio else "📝 Текст"
+    notif_status = "🔔 Включены" if notification else "🔕 Отключены"
+    
+    # Dynamic buttons based on current settings
+    if is_audio:
+        format_button = InlineKeyboardButton(text="📝 Выбрать текстовые ответы", callback_data="format_text")
+    else:
+        format_button = InlineKeyboardButton(text="🎧 Выбрать аудиоответы", callback_data="format_audio")
+    
+    if notification:
+        notif_button = InlineKeyboardButton(text="🔕 Отключить уведомления", callback_data="notifications_off")
+    else:
+        notif_button = InlineKeyboardButton(text="🔔 Включить уведомления", callback_data="notifications_on")
+    
+    settings_text = (
+        "⚙️ <b>Настройки</b>\n\n"
+        "<b>Текущие настройки:</b>\n"
+        f"💬 Формат ответов: {audio_status}\n"
+        f"🔔 Уведомления: {notif_status}\n\n"
+        "Выберите действие:"
+    )
+    return settings_text, InlineKeyboardMarkup(inline_keyboard=[[format_button], [notif_button]])
+
+# Only four settings states exist, so render each of them once
+_SETTINGS_VIEWS = {
+    (is_audio, notification): _build_settings_view(is_audio, notification)
+    for is_audio in (False, True)
+    for notification in (False, True)
+}
+
+def _render_settings(user) -> tuple[str, InlineKeyboardMarkup]:
+    """Settings menu text and keyboard for a user (unknown users get the defaults)"""
+    if not user:
+        return _SETTINGS_VIEWS[(False, False)]
+    return _SETTINGS_VIEWS[(bool(user.isAudio), bool(user.notification))]
+
 @content_router.message(Command('settings'))
 async def settings_command(message: types.Message, supabase_client):
     """Settings command handler"""
     try:
         # Get current user settings from database
         user = await supabase_client.get_user_by_telegram_id(message.from_user.id)
-        
-        if user:
-            audio_status = "🔊 Аудио" if user.isAudio else "📝 Текст"
-            notif_status = "🔔 Включены" if user.notification else "🔕 Отключены"
-            
-            # Dynamic buttons based on current settings
-            if user.isAudio:
-                format_button_text = "📝 Выбрать текстовые ответы"
-                format_callback = "format_text"
-            else:
-                format_button_text = "🎧 Выбрать аудиоответы"
-                format_callback = "format_audio"
-            
-            if user.notification:
-                notif_button_text = "🔕 Отключить уведомления"
-                notif_callback = "notifications_off"
-            else:
-                notif_button_text = "🔔 Включить уведомления"
-                notif_callback = "notifications_on"
-        else:
-            audio_status = "📝 Текст"
-            notif_status = "🔕 Отключены"
-            format_button_text = "🎧 Выбрать аудиоответы"
-            format_callback = "format_audio"
-            notif_button_text = "🔔 Включить уведомления"
-            notif_callback = "notifications_on"
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=format_button_text, callback_data=format_callback)],
-            [InlineKeyboardButton(text=notif_button_text, callback_data=notif_callback)]
-        ])
-        
-        settings_text = (
-            "⚙️ <b>Настройки</b>\n\n"
-            "<b>Текущие настройки:</b>\n"
-            f"💬 Формат ответов: {audio_status}\n"
-            f"🔔 Уведомления: {notif_status}\n\n"
-            "Выберите действие:"
-        )
+        settings_text, keyboard = _render_settings(user)
         
         await message.answer(
             settings_text,
@@ -293,78 +441,42 @@ async def settings_command(message: types.Message, supabase_client):
             parse_mode="HTML"
         )
     except Exception as e:
-        logging.error(f"Error in settings command: {e}")
+        logger.error("Error in settings command: %s", e)
         await message.answer("Произошла ошибка при загрузке настроек")
 
 
 
-@content_router.callback_query(lambda c: c.data == 'setting_quiz')
-async def setting_quiz(callback_query: types.CallbackQuery):
-    """Handle quiz setting"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🎯 Начать квиз", callback_data="start_quiz")],
-        [InlineKeyboardButton(text="📊 Мои результаты", callback_data="quiz_results")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_settings")]
-    ])
-    
-    await callback_query.message.edit_text(
-        "📝 <b>Прохождение квиза по темам эфира</b>\n\nПроверьте свои знания по темам эфира:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
-
-@content_router.callback_query(lambda c: c.data == 'back_to_settings')
+@callback_route('back_to_settings')
 async def back_to_settings(callback_query: types.CallbackQuery, supabase_client):
     """Go back to main settings menu"""
+    await asyncio.gather(
+        safe_callback_answer(callback_query),
+        show_settings(callback_query, supabase_client)
+    )
+
+async def show_settings(callback_query: types.CallbackQuery, supabase_client, user=None):
+    """Render main settings menu into the callback message (pass user when its row is already at hand)"""
     try:
         # Get current user settings from database
-        user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
-        
-        if user:
-            audio_status = "🔊 Аудио" if user.isAudio else "📝 Текст"
-            notif_status = "🔔 Включены" if user.notification else "🔕 Отключены"
-            
-            # Dynamic buttons based on current settings
-            if user.isAudio:
-                format_button_text = "📝 Выбрать текстовые ответы"
-                format_callback = "format_text"
-            else:
-                format_button_text = "🎧 Выбрать аудиоответы"
-                format_callback = "format_audio"
-            
-            if user.notification:
-                notif_button_text = "🔕 Отключить уведомления"
-                notif_callback = "notifications_off"
-            else:
-                notif_button_text = "🔔 Включить уведомления"
-                notif_callback = "notifications_on"
-        else:
-            audio_status = "📝 Текст"
-            notif_status = "🔕 Отключены"
-            format_button_text = "🎧 Выбрать аудиоответы"
-            format_callback = "format_audio"
-            notif_button_text = "🔔 Включить уведомления"
-            notif_callback = "notifications_on"
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=format_button_text, callback_data=format_callback)],
-            [InlineKeyboardButton(text=notif_button_text, callback_data=notif_callback)]
-        ])
+        if user is None:
+            user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
+        settings_text, keyboard = _render_settings(user)
         
-        settings_text = (
-            "⚙️ <b>Настройки</b>\n\n"
-            "<b>Текущие настройки:</b>\n"
-            f"💬 Формат ответов: {audio_status}\n"
-            f"🔔 Уведомления: {notif_status}\n\n"
-            "Выберите действие:"
-        )
+        # Skip the API call when the message already shows this view, and only swap buttons when the text matches
+        message = callback_query.message
+        text_unchanged = message.html_text == settings_text
+        if text_unchanged and message.reply_markup == keyboard:
+            return
         
         try:
-            await callback_query.message.edit_text(
-                settings_text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
+            if text_unchanged:
+                await message.edit_reply_markup(reply_markup=keyboard)
+            else:
+                await message.edit_text(
+                    settings_text,
+                    reply_markup=keyboard,
+                    parse_mode="HTML"
+                )
         except Exception as edit_error:
             # Handle case when message content is the same (Telegram error)
             if "message is not modified" in str(edit_error):
@@ -374,15 +486,28 @@ async def back_to_settings(callback_query: types.CallbackQuery, supabase_client)
                 # Re-raise other errors
                 raise edit_error
     except Exception as e:
-        logging.error(f"Error in back_to_settings: {e}")
+        logger.error("Error in show_settings: %s", e)
         await safe_callback_answer(callback_query, "Произошла ошибка при загрузке настроек")
 
-@content_router.callback_query(lambda c: c.data in ['format_text', 'format_audio'])
+async def _render_after_write(callback_query: types.CallbackQuery, supabase_client, write, **changes):
+    """Show settings with changes applied, running write() in the background when the current row is at hand (usually cached)"""
+    user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
+    if user is None:
+        user = await write()
+    else:
+        _run_in_background(_log_failed_write(write(), callback_query.from_user.id))
+        user = user.model_copy(update=changes)
+    await show_settings(callback_query, supabase_client, user)
+
+@callback_route('format_text', 'format_audio')
 async def handle_format_selection(callback_query: types.CallbackQuery, supabase_client):
     """Handle response format selection"""
     is_audio = callback_query.data == 'format_audio'
     format_type = "аудио" if is_audio else "текстовом"
     
+    # The confirmation does not depend on the DB write, so stop the button spinner right away
+    _run_in_background(safe_callback_answer(callback_query, f"✅ Формат изменен на {format_type}"))
+    
     try:
         # Save user preference to database
         user_data = {
@@ -390,24 +515,25 @@ async def handle_format_selection(callback_query: types.CallbackQuery, supabase_
             'isAudio': is_audio
         }
         
-        await supabase_client.create_or_update_user(user_data)
-        
-        # Show brief confirmation and redirect back to settings
-        try:
-            await callback_query.answer(f"✅ Формат изменен на {format_type}")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
-        
-        # Redirect back to settings menu
-        await back_to_settings(callback_query, supabase_client)
+        # Redirect back to settings menu, saving in the background when possible
+        await _render_after_write(
+            callback_query,
+            supabase_client,
+            partial(supabase_client.create_or_update_user, user_data),
+            isAudio=is_audio
+        )
     except Exception as e:
-        logging.error(f"Error saving format preference: {e}")
-        try:
-            await callback_query.answer("Произошла ошибка при сохранении настроек")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
+        logger.error("Error saving format preference: %s", e)
+        await _report_callback_error(callback_query, "Произошла ошибка при сохранении настроек")
+
+@lru_cache(maxsize=8)
+def _timezone_detection_keyboard(frequency_key: str) -> InlineKeyboardMarkup:
+    """Inline keyboard with timezone options for a frequency"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📍 Поделиться местоположением", callback_data=f"tz_request_location_{frequency_key}")],
+        [InlineKeyboardButton(text="⌨️ Ввести часовой пояс вручную", callback_data=f"tz_manual_input_{frequency_key}")],
+        [InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")]
+    ])
 
 async def show_timezone_detection(callback_query: types.CallbackQuery, frequency_key: str, frequency_name: str, state: FSMContext):
     """Show timezone detection options"""
@@ -417,87 +543,90 @@ async def show_timezone_detection(callback_query: types.CallbackQuery, frequency
         frequency_name=frequency_name
     )
     
-    # Create inline keyboard with timezone options
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📍 Поделиться местоположением", callback_data=f"tz_request_location_{frequency_key}")],
-        [InlineKeyboardButton(text="⌨️ Ввести часовой пояс вручную", callback_data=f"tz_manual_input_{frequency_key}")],
-        [InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")]
-    ])
-    
     await callback_query.message.edit_text(
         "🌍 <b>Определение часового пояса</b>\n\n"
         f"Частота: {frequency_name}\n\n"
         "Для точного определения часового пояса:\n\n"
         "📍 <b>Поделитесь местоположением</b> - автоматически определим часовой пояс\n\n"
         "⌨️ <b>Или введите вручную</b> - формат UTC+1, UTC-5 и т.д.",
-        reply_markup=keyboard,
+        reply_markup=_timezone_detection_keyboard(frequency_key),
         parse_mode="HTML"
     )
 
+# Common timezones for users
+_TIMEZONES = (
+    ("UTC-12", "UTC-12 (Baker Island)"),
+    ("UTC-11", "UTC-11 (American Samoa)"),
+    ("UTC-10", "UTC-10 (Hawaii)"),
+    ("UTC-9", "UTC-9 (Alaska)"),
+    ("UTC-8", "UTC-8 (PST)"),
+    ("UTC-7", "UTC-7 (MST)"),
+    ("UTC-6", "UTC-6 (CST)"),
+    ("UTC-5", "UTC-5 (EST)"),
+    ("UTC-4", "UTC-4 (Atlantic)"),
+    ("UTC-3", "UTC-3 (Brazil)"),
+    ("UTC-2", "UTC-2 (Mid-Atlantic)"),
+    ("UTC-1", "UTC-1 (Azores)"),
+    ("UTC", "UTC (Greenwich)"),
+    ("UTC+1", "UTC+1 (Berlin/Paris)"),
+    ("UTC+2", "UTC+2 (Cairo/Athens)"),
+    ("UTC+3", "UTC+3 (Moscow)"),
+    ("UTC+4", "UTC+4 (Dubai)"),
+    ("UTC+5", "UTC+5 (Karachi)"),
+    ("UTC+6", "UTC+6 (Almaty)"),
+    ("UTC+7", "UTC+7 (Bangkok)"),
+    ("UTC+8", "UTC+8 (Beijing)"),
+    ("UTC+9", "UTC+9 (Tokyo)"),
+    ("UTC+10", "UTC+10 (Sydney)"),
+    ("UTC+11", "UTC+11 (Solomon Islands)"),
+    ("UTC+12", "UTC+12 (New Zealand)"),
+)
+# UTC offsets accepted in tz_ callback data
+_TZ_OFFSETS = frozenset(str(offset) for offset in range(-12, 13))
+
+# Display names for notification frequencies; callback data carries only the key
+_FREQUENCY_NAMES = {
+    'daily': 'каждый день',
+    'weekdays': 'только рабочие дни',
+    'weekends': 'только выходные'
+}
+# Shorter forms for the confirmation toast
+_FREQUENCY_SHORT_NAMES = {
+    'daily': 'каждый день',
+    'weekdays': 'рабочие дни',
+    'weekends': 'выходные'
+}
+
 def get_timezone_from_coordinates(latitude: float, longitude: float) -> str:
     """Get timezone from coordinates using simple offset approximation"""
     # Simple timezone calculation based on longitude
     # More accurate would be using a timezone API like timezonefinder library
     
-    # Rough approximation: divide longitude by 15 to get UTC offset
-    timezone_offset = round(longitude / 15)
+    # Rough approximation: divide longitude by 15 to get UTC offset, clamped to the valid range
+    timezone_offset = max(-12, min(12, round(longitude / 15)))
     
-    # Clamp to valid range
-    timezone_offset = max(-12, min(12, timezone_offset))
-    
-    if timezone_offset == 0:
-        return "UTC"
-    elif timezone_offset > 0:
-        return f"UTC+{timezone_offset}"
-    else:
-        return f"UTC{timezone_offset}"  # Already has minus sign
+    # _TIMEZONES runs UTC-12 .. UTC+12, so the offset indexes it directly
+    return _TIMEZONES[timezone_offset + 12][0]
 
-async def show_timezone_selection(callback_query: types.CallbackQuery, frequency_key: str, frequency_name: str):
-    """Show timezone selection interface"""
-    # Common timezones for users
-    timezones = [
-        ("UTC-12", "UTC-12 (Baker Island)"),
-        ("UTC-11", "UTC-11 (American Samoa)"), 
-        ("UTC-10", "UTC-10 (Hawaii)"),
-        ("UTC-9", "UTC-9 (Alaska)"),
-        ("UTC-8", "UTC-8 (PST)"),
-        ("UTC-7", "UTC-7 (MST)"),
-        ("UTC-6", "UTC-6 (CST)"),
-        ("UTC-5", "UTC-5 (EST)"),
-        ("UTC-4", "UTC-4 (Atlantic)"),
-        ("UTC-3", "UTC-3 (Brazil)"),
-        ("UTC-2", "UTC-2 (Mid-Atlantic)"),
-        ("UTC-1", "UTC-1 (Azores)"),
-        ("UTC", "UTC (Greenwich)"),
-        ("UTC+1", "UTC+1 (Berlin/Paris)"),
-        ("UTC+2", "UTC+2 (Cairo/Athens)"),
-        ("UTC+3", "UTC+3 (Moscow)"),
-        ("UTC+4", "UTC+4 (Dubai)"),
-        ("UTC+5", "UTC+5 (Karachi)"),
-        ("UTC+6", "UTC+6 (Almaty)"),
-        ("UTC+7", "UTC+7 (Bangkok)"),
-        ("UTC+8", "UTC+8 (Beijing)"),
-        ("UTC+9", "UTC+9 (Tokyo)"),
-        ("UTC+10", "UTC+10 (Sydney)"),
-        ("UTC+11", "UTC+11 (Solomon Islands)"),
-        ("UTC+12", "UTC+12 (New Zealand)")
-    ]
-    
+@lru_cache(maxsize=8)
+def _timezone_keyboard(frequency_key: str) -> InlineKeyboardMarkup:
+    """Timezone picker for a frequency - only the callback suffix varies, so build each once"""
     # Create buttons - 4 timezones per row
-    buttons = []
-    for i in range(0, len(timezones), 4):
-        row = []
-        for tz_id, tz_name in timezones[i:i+4]:
-            row.append(InlineKeyboardButton(
-                text=tz_id, 
-                callback_data=f"tz_{tz_id.replace('+', 'plus').replace('-', 'minus')}_{frequency_key}"
-            ))
-        buttons.append(row)
+    buttons = [
+        [
+            InlineKeyboardButton(text=tz_id, callback_data=f"tz_{offset}_{frequency_key}")
+            for offset, (tz_id, tz_name) in enumerate(_TIMEZONES[i:i+4], start=i - 12)
+        ]
+        for i in range(0, len(_TIMEZONES), 4)
+    ]
     
     # Add back button
     buttons.append([InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+async def show_timezone_selection(callback_query: types.CallbackQuery, frequency_key: str, frequency_name: str):
+    """Show timezone selection interface"""
+    keyboard = _timezone_keyboard(frequency_key)
     
     await callback_query.message.edit_text(
         "🌍 <b>Выбор часового пояса</b>\n\n"
@@ -507,46 +636,34 @@ async def show_timezone_selection(callback_query: types.CallbackQuery, frequency
         parse_mode="HTML"
     )
 
-@content_router.callback_query(lambda c: c.data.startswith('tz_'))
-async def handle_timezone_selection(callback_query: types.CallbackQuery, supabase_client):
+@callback_prefix('tz_')
+async def handle_timezone_selection(callback_query: types.CallbackQuery, supabase_client, payload: str):
     """Handle timezone selection"""
     try:
-        # Parse callback data: tz_UTCplus1_daily
-        parts = callback_query.data.split('_')
-        if len(parts) < 3:
-            await callback_query.answer("❌ Ошибка в данных часового пояса")
+        # Parse callback payload: {utc_offset}_{frequency_key}, e.g. 3_daily
+        offset, _, frequency_key = payload.partition('_')
+        if not frequency_key or offset not in _TZ_OFFSETS:
+            await safe_callback_answer(callback_query, "❌ Ошибка в данных часового пояса")
             return
-            
-        # Extract timezone and frequency
-        tz_part = '_'.join(parts[1:-1])  # Handle UTC+/- in the middle
-        frequency_key = parts[-1]
         
-        # Convert back to readable timezone
-        timezone = tz_part.replace('plus', '+').replace('minus', '-')
+        timezone = _TIMEZONES[int(offset) + 12][0]
         
         # Save timezone to user record
-        user_data = {
-            'telegram_id': callback_query.from_user.id,
-            'timezone': timezone
-        }
-        await supabase_client.create_or_update_user(user_data)
+        await supabase_client.update_user_timezone(callback_query.from_user.id, timezone)
         
-        # Get frequency name for display
-        frequency_names = {
-            'daily': 'каждый день',
-            'weekdays': 'только рабочие дни', 
-            'weekends': 'только выходные'
-        }
-        frequency_name = frequency_names.get(frequency_key, frequency_key)
+        frequency_name = _FREQUENCY_NAMES.get(frequency_key, frequency_key)
         
         # Now show time selection
-        await show_time_selection(callback_query, frequency_key, frequency_name, page=0)
+        await asyncio.gather(
+            safe_callback_answer(callback_query),
+            show_time_selection(callback_query, frequency_key, frequency_name, page=0)
+        )
         
     except Exception as e:
-        logging.error(f"Error handling timezone selection: {e}")
-        await callback_query.answer("Произошла ошибка при сохранении часового пояса")
+        logger.error("Error handling timezone selection: %s", e)
+        await safe_callback_answer(callback_query, "Произошла ошибка при сохранении часового пояса")
 
-@content_router.callback_query(lambda c: c.data in ['notifications_on', 'notifications_off'])
+@callback_route('notifications_on', 'notifications_off')
 async def handle_notifications_selection(callback_query: types.CallbackQuery, supabase_client):
     """Handle notifications setting selection"""
     notifications_enabled = callback_query.data == 'notifications_on'
@@ -554,63 +671,43 @@ async def handle_notifications_selection(callback_query: types.CallbackQuery, su
     try:
         if notifications_enabled:
             # Show notification frequency options when enabling notifications
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="📅 Каждый день", callback_data="notif_freq_daily")],
-                [InlineKeyboardButton(text="💼 Только рабочие дни", callback_data="notif_freq_weekdays")],
-                [InlineKeyboardButton(text="🏖️ Только выходные", callback_data="notif_freq_weekends")],
-                [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_settings")]
-            ])
-            
-            await callback_query.message.edit_text(
-                "🔔 <b>Настройка уведомлений</b>\n\n"
-                "Выберите частоту получения уведомлений:",
-                reply_markup=keyboard,
-                parse_mode="HTML"
+            await asyncio.gather(
+                safe_callback_answer(callback_query),
+                _as_coroutine(callback_query.message.edit_text(
+                    "🔔 <b>Настройка уведомлений</b>\n\n"
+                    "Выберите частоту получения уведомлений:",
+                    reply_markup=_NOTIFS_KB,
+                    parse_mode="HTML"
+                ))
             )
         else:
-            # Disable notifications completely
-            user_data = {
-                'telegram_id': callback_query.from_user.id,
-                'notification': False
-            }
-            
-            await supabase_client.create_or_update_user(user_data)
-            
-            # Clear notification settings
-            user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
-            if user:
-                await supabase_client.create_or_update_notification_settings(user.id, {})
-            
-            try:
-                await callback_query.answer("✅ Уведомления отключены")
-            except Exception:
-                # Ignore callback answer timeouts
-                pass
-            await back_to_settings(callback_query, supabase_client)
+            # The confirmation does not depend on the DB writes, so stop the button spinner right away
+            _run_in_background(safe_callback_answer(callback_query, "✅ Уведомления отключены"))
             
+            # Disable notifications and clear their settings in one write, rendering the result without waiting for it
+            await _render_after_write(
+                callback_query,
+                supabase_client,
+                partial(supabase_client.set_user_notification, callback_query.from_user.id, False, {}),
+                notification=False
+            )
     except Exception as e:
-        logging.error(f"Error saving notification preference: {e}")
-        try:
-            await callback_query.answer("Произошла ошибка при сохранении настроек")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
+        logger.error("Error saving notification preference: %s", e)
+        await _report_callback_error(callback_query, "Произошла ошибка при сохранении настроек")
 
-@content_router.callback_query(lambda c: c.data.startswith('notif_freq_'))
+@callback_prefix('notif_freq_')
 async def handle_notification_frequency_selection(callback_query: types.CallbackQuery, supabase_client, state: FSMContext):
     """Handle notification frequency selection"""
     try:
-        user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
-        if not user:
-            await callback_query.answer("Ошибка: пользователь не найден")
-            return
-            
-        # Enable notifications in user table
+        # Enable notifications in user table. The upsert on telegram_id creates a missing user,
+        # so an empty result only means the write itself failed
         user_data = {
             'telegram_id': callback_query.from_user.id,
             'notification': True
         }
-        await supabase_client.create_or_update_user(user_data)
+        if not await supabase_client.create_or_update_user(user_data):
+            await safe_callback_answer(callback_query, "Произошла ошибка при сохранении настроек")
+            return
         
         # Parse selected frequency
         frequency_map = {
@@ -623,291 +720,208 @@ async def handle_notification_frequency_selection(callback_query: types.Callback
             frequency_key, frequency_name = frequency_map[callback_query.data]
             
             # Show location-based timezone detection
-            await show_timezone_detection(callback_query, frequency_key, frequency_name, state)
+            await asyncio.gather(
+                safe_callback_answer(callback_query),
+                show_timezone_detection(callback_query, frequency_key, frequency_name, state)
+            )
         else:
-            try:
-                await callback_query.answer("❌ Неизвестная частота уведомлений")
-            except Exception:
-                # Ignore callback answer timeouts
-                pass
+            await safe_callback_answer(callback_query, "❌ Неизвестная частота уведомлений")
         
     except Exception as e:
-        logging.error(f"Error saving notification frequency: {e}")
-        try:
-            await callback_query.answer("Произошла ошибка при сохранении настроек")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
+        logger.error("Error saving notification frequency: %s", e)
+        await safe_callback_answer(callback_query, "Произошла ошибка при сохранении настроек")
+
+# Notification hours are offered 12 per page: 00-11 and 12-23
+_HOURS_PER_PAGE = 12
+_TIME_PAGES = 2
+
+@lru_cache(maxsize=8)
+def _time_keyboard(frequency_key: str, page: int) -> InlineKeyboardMarkup:
+    """Hour picker for a frequency and page - built once per combination"""
+    start_hour = page * _HOURS_PER_PAGE
+    
+    # Create time buttons (3 per row; 12 hours per page fill the rows exactly)
+    hours = iter(range(start_hour, start_hour + _HOURS_PER_PAGE))
+    buttons = [
+        [
+            InlineKeyboardButton(text=f"{hour:02d}:00", callback_data=f"notif_time_{frequency_key}_{hour:02d}:00")
+            for hour in row
+        ]
+        for row in zip(*[hours] * 3)
+    ]
+    
+    # Add navigation buttons
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton(
+            text="⬅️ Предыдущие",
+            callback_data=f"time_page_{frequency_key}_{page-1}"
+        ))
+    
+    if page < _TIME_PAGES - 1:
+        nav_buttons.append(InlineKeyboardButton(
+            text="Следующие ➡️",
+            callback_data=f"time_page_{frequency_key}_{page+1}"
+        ))
+    
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    
+    # Add back button
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 async def show_time_selection(callback_query: types.CallbackQuery, frequency_key: str, frequency_name: str, page: int = 0):
     """Show time selection with pagination (12 hours per page)"""
     try:
-        hours_per_page = 12
-        total_pages = 2  # 0-11 and 12-23
-        
         # Ensure page is within bounds
-        page = max(0, min(page, total_pages - 1))
-        
-        # Get hours for current page
-        start_hour = page * hours_per_page
-        end_hour = start_hour + hours_per_page
-        
-        # Create time buttons (3 per row)
-        buttons = []
-        current_row = []
-        
-        for hour in range(start_hour, end_hour):
-            hour_text = f"{hour:02d}:00"
-            button = InlineKeyboardButton(
-                text=hour_text,
-                callback_data=f"notif_time_{frequency_key}_{hour:02d}:00"
-            )
-            current_row.append(button)
-            
-            # Add 3 buttons per row
-            if len(current_row) == 3:
-                buttons.append(current_row)
-                current_row = []
-        
-        # Add remaining buttons if any
-        if current_row:
-            buttons.append(current_row)
-        
-        # Add navigation buttons
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(
-                text="⬅️ Предыдущие",
-                callback_data=f"time_page_{frequency_key}_{frequency_name}_{page-1}"
-            ))
-        
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(
-                text="Следующие ➡️",
-                callback_data=f"time_page_{frequency_key}_{frequency_name}_{page+1}"
-            ))
-        
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        
-        # Add back button
-        buttons.append([InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-        
-        page_info = f"({start_hour:02d}:00 - {end_hour-1:02d}:00)" if end_hour <= 24 else f"({start_hour:02d}:00 - 23:00)"
+        page = max(0, min(page, _TIME_PAGES - 1))
+        start_hour = page * _HOURS_PER_PAGE
         
         await callback_query.message.edit_text(
             f"🕐 <b>Выбор времени уведомлений</b>\n\n"
             f"Частота: {frequency_name}\n"
-            f"Выберите час {page_info}:",
-            reply_markup=keyboard,
+            f"Выберите час ({start_hour:02d}:00 - {start_hour + _HOURS_PER_PAGE - 1:02d}:00):",
+            reply_markup=_time_keyboard(frequency_key, page),
             parse_mode="HTML"
         )
         
     except Exception as e:
-        logging.error(f"Error in show_time_selection: {e}")
+        logger.error("Error in show_time_selection: %s", e)
         await callback_query.message.edit_text("Ошибка при отображении времени")
 
-@content_router.callback_query(lambda c: c.data.startswith('time_page_'))
-async def handle_time_page_navigation(callback_query: types.CallbackQuery):
+@callback_prefix('time_page_')
+async def handle_time_page_navigation(callback_query: types.CallbackQuery, payload: str):
     """Handle time selection pagination"""
     try:
-        # Parse callback data: time_page_{frequency_key}_{frequency_name}_{page}
-        parts = callback_query.data.split('_', 4)
-        if len(parts) >= 5:
-            frequency_key = parts[2]
-            frequency_name = parts[3]
-            page = int(parts[4])
+        # Parse callback payload: {frequency_key}_{page}
+        frequency_key, _, page = payload.partition('_')
+        if page:
+            frequency_name = _FREQUENCY_NAMES.get(frequency_key, frequency_key)
+            page = int(page)
             
-            await show_time_selection(callback_query, frequency_key, frequency_name, page)
-            try:
-                await callback_query.answer()
-            except Exception:
-                # Ignore callback answer timeouts
-                pass
+            await asyncio.gather(
+                safe_callback_answer(callback_query),
+                show_time_selection(callback_query, frequency_key, frequency_name, page)
+            )
         
     except Exception as e:
-        logging.error(f"Error in time page navigation: {e}")
-        try:
-            await callback_query.answer("Ошибка при навигации")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
+        logger.error("Error in time page navigation: %s", e)
+        await safe_callback_answer(callback_query, "Ошибка при навигации")
 
-@content_router.callback_query(lambda c: c.data.startswith('notif_time_'))
-async def handle_notification_time_selection(callback_query: types.CallbackQuery, supabase_client):
+@callback_prefix('notif_time_')
+async def handle_notification_time_selection(callback_query: types.CallbackQuery, supabase_client, payload: str):
     """Handle final notification time selection"""
     try:
-        # Parse callback data: notif_time_{frequency}_{time}
-        parts = callback_query.data.split('_', 3)
-        if len(parts) >= 4:
-            frequency = parts[2]
-            time = parts[3]
-            
-            user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
-            if not user:
-                try:
-                    await callback_query.answer("Ошибка: пользователь не найден")
-                except Exception:
-                    # Ignore callback answer timeouts
-                    pass
-                return
-            
-            # Save complete notification settings
+        # Parse callback payload: {frequency}_{time}
+        frequency, _, time = payload.partition('_')
+        if time:
+            # Save complete notification settings together with the notification flag in one write
             notification_settings = {
                 'frequency': frequency,
                 'time': time
             }
+            user = await supabase_client.set_user_notification(callback_query.from_user.id, True, notification_settings)
+            if not user:
+                await safe_callback_answer(callback_query, "Ошибка: пользователь не найден")
+                return
             
-            await supabase_client.create_or_update_notification_settings(user.id, notification_settings)
-            
-            # Show confirmation
-            frequency_names = {
-                'daily': 'каждый день',
-                'weekdays': 'рабочие дни',
-                'weekends': 'выходные'
-            }
-            frequency_name = frequency_names.get(frequency, frequency)
-            
-            try:
-                await callback_query.answer(f"✅ Уведомления настроены: {frequency_name} в {time}")
-            except Exception:
-                # Ignore callback answer timeouts
-                pass
-            await back_to_settings(callback_query, supabase_client)
+            # Show confirmation while the settings view is being rendered
+            frequency_name = _FREQUENCY_SHORT_NAMES.get(frequency, frequency)
+            _run_in_background(safe_callback_answer(callback_query, f"✅ Уведомления настроены: {frequency_name} в {time}"))
+            await show_settings(callback_query, supabase_client, user)
         
     except Exception as e:
-        logging.error(f"Error saving notification time: {e}")
-        try:
-            await callback_query.answer("Произошла ошибка при сохранении времени")
-        except Exception:
-            # Ignore callback answer timeouts
-            pass
+        logger.error("Error saving notification time: %s", e)
+        await safe_callback_answer(callback_query, "Произошла ошибка при сохранении времени")
 
-@content_router.callback_query(lambda c: c.data.startswith('quiz_page_'))
-async def handle_quiz_pagination(callback_query: types.CallbackQuery):
+@callback_prefix('quiz_page_')
+async def handle_quiz_pagination(callback_query: types.CallbackQuery, payload: str):
     """Handle quiz pagination"""
     try:
-        # Extract page number from callback data
-        page = int(callback_query.data.replace('quiz_page_', ''))
-        
-        # Show quiz topics for the requested page
-        await show_quiz_topics(callback_query.message, page=page, edit_message=True)
+        # Page number is the callback payload after quiz_page_
+        page = int(payload)
         
-        # Answer callback query
-        await safe_callback_answer(callback_query)
+        # Show quiz topics for the requested page while answering the callback query
+        await asyncio.gather(
+            safe_callback_answer(callback_query),
+            show_quiz_topics(callback_query.message, page=page, edit_message=True)
+        )
         
     except Exception as e:
-        logging.error(f"Error in handle_quiz_pagination: {e}")
+        logger.error("Error in handle_quiz_pagination: %s", e)
         await safe_callback_answer(callback_query, "Ошибка при навигации по страницам")
 
-@content_router.callback_query(lambda c: c.data in ['start_quiz', 'quiz_results'])
-async def handle_quiz_actions(callback_query: types.CallbackQuery):
-    """Handle quiz actions"""
-    if callback_query.data == 'start_quiz':
-        await callback_query.message.edit_text(
-            "🎯 <b>Квиз в разработке</b>\n\n"
-            "Функционал квиза по темам эфира скоро будет доступен!\n"
-            "Следите за обновлениями.",
-            parse_mode="HTML"
-        )
-    else:  # quiz_results
-        await callback_query.message.edit_text(
-            "📊 <b>Результаты квиза</b>\n\n"
-            "У вас пока нет результатов квизов.\n"
-            "Пройдите квиз, чтобы увидеть свои достижения!",
-            parse_mode="HTML"
-        )
-
-@content_router.callback_query(lambda c: c.data == 'materials_web_app')
-async def handle_materials_web_app(callback_query: types.CallbackQuery):
-    """Handle web app materials selection"""
-    try:
-        webapp_url = f"{Config.WEBAPP_URL}"
-        webapp_button = InlineKeyboardButton(
-            text="🌐 Открыть Web App",
-            web_app=WebAppInfo(url=webapp_url)
-        )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[webapp_button]])
-        
-        await callback_query.message.edit_text(
-            "🌐 <b>Web App</b>\n\n"
-            "Интерактивные материалы и приложения для обучения.\n"
-            "Нажмите кнопку ниже для доступа к веб-приложению:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    except Exception as e:
-        logging.error(f"Error in materials_web_app: {e}")
-        await safe_callback_answer(callback_query, "Ошибка при загрузке веб-приложения")
+# Callbacks whose reply never changes: callback_data -> (text, keyboard)
+_STATIC_RESPONSES = {
+    'setting_quiz': (
+        "📝 <b>Прохождение квиза по темам эфира</b>\n\nПроверьте свои знания по темам эфира:",
+        _QUIZ_KB
+    ),
+    'start_quiz': (
+        "🎯 <b>Квиз в разработке</b>\n\n"
+        "Функционал квиза по темам эфира скоро будет доступен!\n"
+        "Следите за обновлениями.",
+        None
+    ),
+    'quiz_results': (
+        "📊 <b>Результаты квиза</b>\n\n"
+        "У вас пока нет результатов квизов.\n"
+        "Пройдите квиз, чтобы увидеть свои достижения!",
+        None
+    ),
+    'materials_web_app': (
+        "🌐 <b>Web App</b>\n\n"
+        "Интерактивные материалы и приложения для обучения.\n"
+        "Нажмите кнопку ниже для доступа к веб-приложению:",
+        _WEBAPP_KB_WEB_APP
+    ),
+    'materials_videos': (
+        "🎥 <b>Videos</b>\n\n"
+        "Видеоуроки, записи лекций и обучающие материалы.\n"
+        "Нажмите кнопку ниже для просмотра видеоматериалов:",
+        _WEBAPP_KB_VIDEOS
+    ),
+    'materials_texts': (
+        "📝 <b>Texts</b>\n\n"
+        "Статьи, конспекты, учебные материалы и документация.\n"
+        "Нажмите кнопку ниже для доступа к текстовым материалам:",
+        _WEBAPP_KB_TEXTS
+    ),
+    'materials_podcasts': (
+        "🎧 <b>Podcasts</b>\n\n"
+        "Аудиоматериалы, подкасты и записи обсуждений.\n"
+        "Нажмите кнопку ниже для прослушивания подкастов:",
+        _WEBAPP_KB_PODCASTS
+    ),
+}
 
-@content_router.callback_query(lambda c: c.data == 'materials_videos')
-async def handle_materials_videos(callback_query: types.CallbackQuery):
-    """Handle videos materials selection"""
-    try:
-        webapp_url = f"{Config.WEBAPP_URL}/videos"
-        webapp_button = InlineKeyboardButton(
-            text="🎥 Открыть видео",
-            web_app=WebAppInfo(url=webapp_url)
-        )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[webapp_button]])
-        
-        await callback_query.message.edit_text(
-            "🎥 <b>Videos</b>\n\n"
-            "Видеоуроки, записи лекций и обучающие материалы.\n"
-            "Нажмите кнопку ниже для просмотра видеоматериалов:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    except Exception as e:
-        logging.error(f"Error in materials_videos: {e}")
-        await safe_callback_answer(callback_query, "Ошибка при загрузке видео")
+_STATIC_RESPONSE_ERRORS = {
+    'materials_web_app': "Ошибка при загрузке веб-приложения",
+    'materials_videos': "Ошибка при загрузке видео",
+    'materials_texts': "Ошибка при загрузке текстов",
+    'materials_podcasts': "Ошибка при загрузке подкастов",
+}
 
-@content_router.callback_query(lambda c: c.data == 'materials_texts')
-async def handle_materials_texts(callback_query: types.CallbackQuery):
-    """Handle texts materials selection"""
+@callback_route(*_STATIC_RESPONSES)
+async def handle_static_response(callback_query: types.CallbackQuery):
+    """Handle quiz setting, quiz actions and materials selection"""
+    text, keyboard = _STATIC_RESPONSES[callback_query.data]
     try:
-        webapp_url = f"{Config.WEBAPP_URL}/texts"
-        webapp_button = InlineKeyboardButton(
-            text="📝 Открыть тексты",
-            web_app=WebAppInfo(url=webapp_url)
-        )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[webapp_button]])
-        
-        await callback_query.message.edit_text(
-            "📝 <b>Texts</b>\n\n"
-            "Статьи, конспекты, учебные материалы и документация.\n"
-            "Нажмите кнопку ниже для доступа к текстовым материалам:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        await asyncio.gather(
+            safe_callback_answer(callback_query),
+            _as_coroutine(callback_query.message.edit_text(
+                text,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            ))
         )
     except Exception as e:
-        logging.error(f"Error in materials_texts: {e}")
-        await safe_callback_answer(callback_query, "Ошибка при загрузке текстов")
-
-@content_router.callback_query(lambda c: c.data == 'materials_podcasts')
-async def handle_materials_podcasts(callback_query: types.CallbackQuery):
-    """Handle podcasts materials selection"""
-    try:
-        webapp_url = f"{Config.WEBAPP_URL}/podcasts"
-        webapp_button = InlineKeyboardButton(
-            text="🎧 Открыть подкасты",
-            web_app=WebAppInfo(url=webapp_url)
-        )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[webapp_button]])
-        
-        await callback_query.message.edit_text(
-            "🎧 <b>Podcasts</b>\n\n"
-            "Аудиоматериалы, подкасты и записи обсуждений.\n"
-            "Нажмите кнопку ниже для прослушивания подкастов:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        logger.error("Error in %s: %s", callback_query.data, e)
+        await _report_callback_error(
+            callback_query,
+            _STATIC_RESPONSE_ERRORS.get(callback_query.data, "Произошла ошибка. Попробуйте еще раз.")
         )
-    except Exception as e:
-        logging.error(f"Error in materials_podcasts: {e}")
-        await safe_callback_answer(callback_query, "Ошибка при загрузке подкастов")
-
 
 @content_router.message(Command('help'))
 async def command_request(message: types.Message, state: FSMContext) -> None:
@@ -915,31 +929,101 @@ async def command_request(message: types.Message, state: FSMContext) -> None:
     await message.answer("Пожалуйста, напиши Ваш вопрос в свободной форме и <b>одним сообщением</b>!", parse_mode="HTML")
     await state.set_state(UserState.help)
 
+async def _notify_admin(bot, texts: list[str]):
+    """Send questions to the admin as one message, one by one if Telegram rejects the batch, logging instead of raising"""
+    try:
+        await bot.send_message(chat_id=_ADMIN_ID, text="\n\n".join(texts), parse_mode="HTML")
+    except TelegramBadRequest as e:
+        if len(texts) == 1:
+            logger.error("Error sending help message: %s", e)
+            return
+        # Don't let one malformed question cost the admin the rest of the batch
+        logger.warning("Admin batch rejected, sending %d questions separately: %s", len(texts), e)
+        for text in texts:
+            await _notify_admin(bot, [text])
+    except Exception as e:
+        logger.error("Error sending help message: %s", e)
+
+# Questions for the admin go through one queue worker that joins those arriving within a second into one message
+_ADMIN_BATCH_WINDOW = 1.0
+_ADMIN_BATCH_SIZE = 10
+_ADMIN_MESSAGE_LIMIT = 4096
+_ADMIN_FLUSH_TIMEOUT = 10.0
+_admin_queue: asyncio.Queue | None = None
+
+async def _admin_notifier_worker(bot, queue: asyncio.Queue):
+    """Drain the admin queue, sending each batch as few messages as the length limit allows"""
+    loop = asyncio.get_running_loop()
+    while True:
+        texts = [await queue.get()]
+        deadline = loop.time() + _ADMIN_BATCH_WINDOW
+        while len(texts) < _ADMIN_BATCH_SIZE:
+            try:
+                texts.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+
+        batch = [texts[0]]
+        for text in texts[1:]:
+            if sum(len(t) + 2 for t in batch) + len(text) > _ADMIN_MESSAGE_LIMIT:
+                await _notify_admin(bot, batch)
+                batch = [text]
+            else:
+                batch.append(text)
+        await _notify_admin(bot, batch)
+        for _ in texts:
+            queue.task_done()
+
+def _queue_admin_notification(bot, text: str):
+    """Queue a message for the admin, starting the worker on first use"""
+    global _admin_queue
+    if _admin_queue is None:
+        _admin_queue = asyncio.Queue()
+        _run_in_background(_admin_notifier_worker(bot, _admin_queue))
+    _admin_queue.put_nowait(text)
+
+@content_router.shutdown()
+async def flush_admin_notifications():
+    """Send questions still waiting in the admin queue before the bot session closes"""
+    if _admin_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_admin_queue.join(), _ADMIN_FLUSH_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error("Timed out sending queued help messages to the admin")
+
 # Request help - send to admin
 @content_router.message(UserState.help)
 async def help(message: types.Message, state: FSMContext):
     """Send message to admin"""
-    user_mention = f"[{message.from_user.full_name}](tg://user?id={message.from_user.id})"
-    await message.answer("Ваше сообщение принято. Ожидайте ответа в течении суток. Спасибо, что вы с нами.")
+    reply_text = "Ваше сообщение принято. Ожидайте ответа в течении суток. Спасибо, что вы с нами."
     await state.clear()
     
-    # Send to admin if admin ID is configured
-    if Config.TELEGRAM_ADMIN_ID and Config.TELEGRAM_ADMIN_ID != 0:
-        try:
-            await message.bot.send_message(
-                chat_id=Config.TELEGRAM_ADMIN_ID,
-                text=f"Пользователь {user_mention} спрашивает:\n\n{message.text}",
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            logging.error(f"Error sending message to admin: {e}")
+    # Queue the question for the admin if admin ID is configured; the user reply doesn't wait for it
+    if _ADMIN_ID:
+        # Escape user-supplied text so a stray tag can't break the HTML of the whole batch
+        user_mention = f'<a href="tg://user?id={message.from_user.id}">{escape(message.from_user.full_name)}</a>'
+        _queue_admin_notification(
+            message.bot,
+            f"Пользователь {user_mention} спрашивает:\n\n{escape(message.text or '')}"
+        )
+    
+    await message.answer(reply_text)
+
+async def _reject_non_admin(message: types.Message) -> bool:
+    """Tell anyone but the configured admin that the command is admin-only; True if the sender was rejected"""
+    if _ADMIN_ID and message.from_user.id == _ADMIN_ID:
+        return False
+    await message.answer("⛔ Эта команда доступна только администратору.")
+    return True
 
 @content_router.message(Command('test_notification'))
-async def test_notification_command(message: types.Message, supabase_client):
+async def test_notification_command(message: types.Message, notification_scheduler: NotificationScheduler):
     """Test notification command - for admin use"""
+    if await _reject_non_admin(message):
+        return
     try:
-        scheduler = NotificationScheduler(message.bot, supabase_client)
-        success = await scheduler.send_test_notification(message.from_user.id)
+        success = await notification_scheduler.send_test_notification(message.from_user.id)
         
         if success:
             await message.answer("✅ Тестовое уведомление отправлено!")
@@ -947,15 +1031,16 @@ async def test_notification_command(message: types.Message, supabase_client):
             await message.answer("❌ Ошибка при отправке тестового уведомления")
             
     except Exception as e:
-        logging.error(f"Error in test notification: {e}")
+        logger.error("Error in test notification: %s", e)
         await message.answer("❌ Произошла ошибка")
 
 @content_router.message(Command('send_notifications'))
-async def manual_send_notifications_command(message: types.Message, supabase_client):
+async def manual_send_notifications_command(message: types.Message, notification_scheduler: NotificationScheduler):
     """Manual notification sending command - for admin use"""
+    if await _reject_non_admin(message):
+        return
     try:
-        scheduler = NotificationScheduler(message.bot, supabase_client)
-        result = await scheduler.send_notifications_now()
+        result = await notification_scheduler.send_notifications_now()
         
         if result['status'] == 'completed':
             await message.answer(
@@ -973,15 +1058,16 @@ async def manual_send_notifications_command(message: types.Message, supabase_cli
             await message.answer(f"❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
             
     except Exception as e:
-        logging.error(f"Error in manual send notifications: {e}")
+        logger.error("Error in manual send notifications: %s", e)
         await message.answer("❌ Произошла ошибка при отправке уведомлений")
 
 @content_router.message(Command('notification_status'))
-async def notification_status_command(message: types.Message, supabase_client):
+async def notification_status_command(message: types.Message, notification_scheduler: NotificationScheduler):
     """Check notification system status - for admin use"""
+    if await _reject_non_admin(message):
+        return
     try:
-        scheduler = NotificationScheduler(message.bot, supabase_client)
-        status = await scheduler.get_notification_status()
+        status = await notification_scheduler.get_notification_status()
         
         if 'error' in status:
             await message.answer(f"❌ Ошибка: {status['error']}")
@@ -997,11 +1083,17 @@ async def notification_status_command(message: types.Message, supabase_client):
             )
             
     except Exception as e:
-        logging.error(f"Error in notification status: {e}")
+        logger.error("Error in notification status: %s", e)
         await message.answer("❌ Произошла ошибка при получении статуса")
 
+async def _pop_state_data(state: FSMContext) -> dict:
+    """Read FSM data and clear the state without waiting for the clear to complete"""
+    data = await state.get_data()
+    _run_in_background(state.clear())
+    return data
+
 # Location-based timezone handlers
-@content_router.message(lambda message: message.location is not None, NotificationStates.waiting_for_timezone_location)
+@content_router.message(NotificationStates.waiting_for_timezone_location, F.location)
 async def handle_location_timezone(message: types.Message, state: FSMContext, supabase_client):
     """Handle location sharing for timezone detection"""
     try:
@@ -1012,17 +1104,13 @@ async def handle_location_timezone(message: types.Message, state: FSMContext, su
         # Get timezone from coordinates
         detected_timezone = get_timezone_from_coordinates(latitude, longitude)
         
-        # Get stored frequency data
-        data = await state.get_data()
+        # Get stored frequency data; the setup flow ends here, so the state is cleared right away
+        data = await _pop_state_data(state)
         frequency_key = data.get('frequency_key')
         frequency_name = data.get('frequency_name')
         
-        # Save timezone to user
-        user_data = {
-            'telegram_id': message.from_user.id,
-            'timezone': detected_timezone
-        }
-        await supabase_client.create_or_update_user(user_data)
+        # Save timezone to user; the Supabase client call is synchronous, so it can't overlap the sends
+        await supabase_client.update_user_timezone(message.from_user.id, detected_timezone)
         
         # Remove keyboard and show confirmation
         await message.answer(
@@ -1037,64 +1125,64 @@ async def handle_location_timezone(message: types.Message, state: FSMContext, su
         # Now show time selection
         await show_time_selection_from_state(message, frequency_key, frequency_name, page=0)
         
-        # Clear state
-        await state.clear()
-        
     except Exception as e:
-        logging.error(f"Error handling location timezone: {e}")
+        logger.error("Error handling location timezone: %s", e)
         await message.answer("Произошла ошибка при определении часового пояса.")
 
+# Location request keyboard
+_LOCATION_REQUEST_KB = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="📍 Поделиться местоположением", request_location=True)],
+        [KeyboardButton(text="❌ Отмена")]
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+
 # Handle inline button for requesting location
-@content_router.callback_query(lambda c: c.data.startswith('tz_request_location_'))
+@callback_prefix('tz_request_location_')
 async def handle_location_request(callback_query: types.CallbackQuery, state: FSMContext):
     """Handle request for location sharing"""
-    from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-    
-    # Create location request keyboard
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="📍 Поделиться местоположением", request_location=True)],
-            [KeyboardButton(text="❌ Отмена")]
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
-    
-    await callback_query.message.edit_text(
-        "📍 <b>Запрос местоположения</b>\n\n"
-        "Нажмите кнопку ниже, чтобы поделиться вашим местоположением.\n"
-        "Это поможет автоматически определить ваш часовой пояс.",
-        parse_mode="HTML"
-    )
-    
-    await callback_query.message.answer(
-        "👆 Нажмите кнопку для отправки местоположения:",
-        reply_markup=keyboard
+    # Wait for location (state is set alongside the sends so an early reply is not missed),
+    # while the callback answer, the edit and the prompt go out concurrently
+    await asyncio.gather(
+        state.set_state(NotificationStates.waiting_for_timezone_location),
+        safe_callback_answer(callback_query),
+        _as_coroutine(callback_query.message.edit_text(
+            "📍 <b>Запрос местоположения</b>\n\n"
+            "Нажмите кнопку ниже, чтобы поделиться вашим местоположением.\n"
+            "Это поможет автоматически определить ваш часовой пояс.",
+            parse_mode="HTML"
+        )),
+        _as_coroutine(callback_query.message.answer(
+            "👆 Нажмите кнопку для отправки местоположения:",
+            reply_markup=_LOCATION_REQUEST_KB
+        ))
     )
-    
-    # Set state to wait for location
-    await state.set_state(NotificationStates.waiting_for_timezone_location)
 
 # Handle inline button for manual timezone input
-@content_router.callback_query(lambda c: c.data.startswith('tz_manual_input_'))
+@callback_prefix('tz_manual_input_')
 async def handle_manual_timezone_request(callback_query: types.CallbackQuery, state: FSMContext):
     """Handle request for manual timezone input"""
-    await callback_query.message.edit_text(
-        "⌨️ <b>Ввод часового пояса</b>\n\n"
-        "Введите ваш часовой пояс в формате:\n"
-        "• <code>UTC</code> для GMT (Лондон)\n"
-        "• <code>UTC+1</code> для Берлина, Парижа\n"
-        "• <code>UTC+3</code> для Москвы\n"
-        "• <code>UTC-5</code> для Нью-Йорка\n\n"
-        "Пример: <code>UTC+1</code>",
-        parse_mode="HTML"
+    await asyncio.gather(
+        safe_callback_answer(callback_query),
+        _as_coroutine(callback_query.message.edit_text(
+            "⌨️ <b>Ввод часового пояса</b>\n\n"
+            "Введите ваш часовой пояс в формате:\n"
+            "• <code>UTC</code> для GMT (Лондон)\n"
+            "• <code>UTC+1</code> для Берлина, Парижа\n"
+            "• <code>UTC+3</code> для Москвы\n"
+            "• <code>UTC-5</code> для Нью-Йорка\n\n"
+            "Пример: <code>UTC+1</code>",
+            parse_mode="HTML"
+        ))
     )
     
     # Change state to wait for manual input
     await state.set_state(NotificationStates.waiting_for_timezone_manual)
 
 # Handle cancel button
-@content_router.message(lambda message: message.text == "❌ Отмена", NotificationStates.waiting_for_timezone_location)
+@content_router.message(NotificationStates.waiting_for_timezone_location, F.text == "❌ Отмена")
 async def handle_timezone_cancel(message: types.Message, state: FSMContext):
     """Handle timezone setup cancellation"""
     await message.answer(
@@ -1103,6 +1191,9 @@ async def handle_timezone_cancel(message: types.Message, state: FSMContext):
     )
     await state.clear()
 
+# Accepted manual timezone input: UTC, UTC+1, UTC-5
+_MANUAL_TZ_RE = re.compile(r'^UTC([+-]\d{1,2})?$')
+
 @content_router.message(NotificationStates.waiting_for_timezone_manual)
 async def handle_manual_timezone_input(message: types.Message, state: FSMContext, supabase_client):
     """Handle manual timezone input"""
@@ -1110,8 +1201,7 @@ async def handle_manual_timezone_input(message: types.Message, state: FSMContext
         timezone_input = message.text.strip().upper()
         
         # Validate timezone format
-        import re
-        if not re.match(r'^UTC([+-]\d{1,2})?$', timezone_input):
+        if not _MANUAL_TZ_RE.match(timezone_input):
             await message.answer(
                 "❌ Неверный формат часового пояса.\n"
                 "Используйте формат: UTC, UTC+1, UTC-5\n\n"
@@ -1119,17 +1209,13 @@ async def handle_manual_timezone_input(message: types.Message, state: FSMContext
             )
             return
         
-        # Get stored frequency data
-        data = await state.get_data()
+        # Get stored frequency data; the setup flow ends here, so the state is cleared right away
+        data = await _pop_state_data(state)
         frequency_key = data.get('frequency_key')
         frequency_name = data.get('frequency_name')
         
-        # Save timezone to user
-        user_data = {
-            'telegram_id': message.from_user.id,
-            'timezone': timezone_input
-        }
-        await supabase_client.create_or_update_user(user_data)
+        # Save timezone to user; the Supabase client call is synchronous, so it can't overlap the sends
+        await supabase_client.update_user_timezone(message.from_user.id, timezone_input)
         
         # Show confirmation
         await message.answer(
@@ -1142,63 +1228,22 @@ async def handle_manual_timezone_input(message: types.Message, state: FSMContext
         # Now show time selection
         await show_time_selection_from_state(message, frequency_key, frequency_name, page=0)
         
-        # Clear state
-        await state.clear()
-        
     except Exception as e:
-        logging.error(f"Error handling manual timezone: {e}")
+        logger.error("Error handling manual timezone: %s", e)
         await message.answer("Произошла ошибка при сохранении часового пояса.")
 
 async def show_time_selection_from_state(message: types.Message, frequency_key: str, frequency_name: str, page: int = 0):
     """Show time selection interface (adapted from callback version)"""
-    # Create time buttons for current page
-    hours_per_page = 12
-    total_hours = 24
-    total_pages = (total_hours + hours_per_page - 1) // hours_per_page
-    
     # Ensure page is within bounds
-    page = max(0, min(page, total_pages - 1))
-    
-    # Calculate start and end hours for current page
-    start_hour = page * hours_per_page
-    end_hour = min(start_hour + hours_per_page, total_hours)
-    
-    # Create time selection buttons
-    buttons = []
-    for i in range(start_hour, end_hour, 4):  # 4 buttons per row
-        row = []
-        for hour in range(i, min(i + 4, end_hour)):
-            time_str = f"{hour:02d}:00"
-            row.append(InlineKeyboardButton(
-                text=time_str, 
-                callback_data=f"notif_time_{time_str}_{frequency_key}"
-            ))
-        if row:
-            buttons.append(row)
-    
-    # Add navigation buttons
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"time_page_{page-1}_{frequency_key}"))
-    
-    nav_buttons.append(InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="noop"))
-    
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"time_page_{page+1}_{frequency_key}"))
-    
-    if nav_buttons:
-        buttons.append(nav_buttons)
-    
-    # Add back button
-    buttons.append([InlineKeyboardButton(text="⬅️ Назад к частоте", callback_data="notifications_on")])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    page = max(0, min(page, _TIME_PAGES - 1))
+    start_hour = page * _HOURS_PER_PAGE
     
+    # Same keyboard as the callback flow, so its buttons reach the notif_time_/time_page_ handlers
     await message.answer(
         f"⏰ <b>Выбор времени уведомлений</b>\n\n"
         f"Частота: {frequency_name}\n"
-        f"Страница {page+1} из {total_pages}\n\n"
-        f"Выберите время (часы {start_hour:02d}:00 - {end_hour-1:02d}:00):",
-        reply_markup=keyboard,
+        f"Страница {page+1} из {_TIME_PAGES}\n\n"
+        f"Выберите время (часы {start_hour:02d}:00 - {start_hour + _HOURS_PER_PAGE - 1:02d}:00):",
+        reply_markup=_time_keyboard(frequency_key, page),
         parse_mode="HTML"
     )
\ No newline at end of file
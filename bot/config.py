@@ -18,6 +18,12 @@ class Config:
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     RATE_LIMIT_REQUESTS_PER_DAY = int(os.getenv('RATE_LIMIT_REQUESTS_PER_DAY', '50'))
     WEBAPP_URL = os.getenv('WEBAPP_URL', 'https://your-webapp-domain.com')
+    # Size of the Bot API HTTP connection pool (aiohttp TCPConnector limit)
+    TELEGRAM_MAX_CONNECTIONS = int(os.getenv('TELEGRAM_MAX_CONNECTIONS', '200'))
+    
+    # Optional Redis FSM storage (falls back to in-memory storage when unset)
+    REDIS_URL = os.getenv('REDIS_URL')
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
 
     # RAG Pipeline Prompt Template
 #    RAG_PROMPT_TEMPLATE = """
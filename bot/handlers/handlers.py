@@ -3,6 +3,7 @@ import tempfile
 import os
 import json
 import time
+from functools import lru_cache
 from aiogram import Router, types, F
 from aiogram.enums import ChatAction
 from aiogram.fsm.context import FSMContext
@@ -17,6 +18,17 @@ import openai
 question_router = Router()
 query_router = Router()
 
+_CONFIGS_DIR = os.path.join(os.path.dirname(__file__), '..', 'configs')
+
+@lru_cache(maxsize=None)
+def load_config(config_file):
+    """Parse a descriptions config from bot/configs once per process; None if the file is missing"""
+    config_path = os.path.join(_CONFIGS_DIR, config_file)
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 def get_proper_title(content_type, original_title):
     """Get proper title from config files based on content type and original title"""
     try:
@@ -34,13 +46,10 @@ def get_proper_title(content_type, original_title):
             return original_title
             
         # Load config file
-        config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', config_file)
-        if not os.path.exists(config_path):
+        config_data = load_config(config_file)
+        if config_data is None:
             return original_title
             
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-            
         # Find matching entry in config
         content_key = 'texts' if content_type == 'text' else 'videos'
         if content_key in config_data and original_title in config_data[content_key]:
@@ -219,10 +228,8 @@ async def handle_user_question(message: types.Message, state: FSMContext, supaba
                 # Create webapp button for the source based on content type
                 if content_type == 'video':
                     # For video: get file_id from config and use name as text
-                    config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'video_descriptions.json')
-                    if os.path.exists(config_path):
-                        with open(config_path, 'r', encoding='utf-8') as f:
-                            video_config = json.load(f)
+                    video_config = load_config('video_descriptions.json')
+                    if video_config is not None:
                         # Find matching video by title (remove .txt if present)
                         title_key = original_title.replace('.txt', '')
                         if title_key in video_config.get('videos', {}):
@@ -235,10 +242,8 @@ async def handle_user_question(message: types.Message, state: FSMContext, supaba
                         webapp_url = f"{Config.WEBAPP_URL}/{content_type}s"
                 elif content_type == 'podcast' or content_type == 'audio':
                     # For podcast: get file_id from config and use name as text
-                    config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'podcast_descriptions.json')
-                    if os.path.exists(config_path):
-                        with open(config_path, 'r', encoding='utf-8') as f:
-                            podcast_config = json.load(f)
+                    podcast_config = load_config('podcast_descriptions.json')
+                    if podcast_config is not None:
                         # Find matching podcast by title (remove .txt if present)
                         title_key = original_title.replace('.txt', '')
                         if title_key in podcast_config.get('videos', {}):  # Note: podcast config uses 'videos' key
@@ -251,10 +256,8 @@ async def handle_user_question(message: types.Message, state: FSMContext, supaba
                         webapp_url = f"{Config.WEBAPP_URL}/{content_type}s"
                 elif content_type == 'text':
                     # For text: get file_id from config and use name as text, URL format is different
-                    config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'text_descriptions.json')
-                    if os.path.exists(config_path):
-                        with open(config_path, 'r', encoding='utf-8') as f:
-                            text_config = json.load(f)
+                    text_config = load_config('text_descriptions.json')
+                    if text_config is not None:
                         # Find matching text by title (remove .txt if present)
                         title_key = original_title.replace('.txt', '')
                         if title_key in text_config.get('texts', {}):
@@ -1,65 +1,133 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
+import queue
+from contextlib import suppress
+from logging.handlers import QueueHandler, QueueListener
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import ErrorEvent
 from bot.config import Config
+from bot.rate_limit import RateLimitMiddleware
 from bot.supabase_client import SupabaseClient
+from bot.services.notification_scheduler import NotificationScheduler
 from bot.commands.commands import start_router, content_router
 from bot.handlers.handlers import question_router, query_router
 
-# Configure logging
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of erroring when the queue is full"""
+
+    def enqueue(self, record):
+        with suppress(queue.Full):
+            self.queue.put_nowait(record)
+
+# Configure logging; while the bot runs, main() moves the stderr handler behind a bounded queue
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+_log_queue = queue.Queue(maxsize=10_000)
 logger = logging.getLogger(__name__)
 
+def ensure_unique_handlers(router: Router):
+    """Fail fast if any handler is registered more than once across the router tree"""
+    seen = set()
+    routers = [router]
+    while routers:
+        current = routers.pop()
+        for event_name, observer in current.observers.items():
+            for handler in observer.handlers:
+                key = (event_name, handler.callback)
+                if key in seen:
+                    raise RuntimeError(
+                        f"Handler {handler.callback.__qualname__} is registered more than once for '{event_name}'"
+                    )
+                seen.add(key)
+        routers.extend(current.sub_routers)
+
+def create_fsm_storage():
+    """Create FSM storage: pooled Redis when REDIS_URL is set, in-memory otherwise"""
+    if not Config.REDIS_URL:
+        return MemoryStorage()
+    
+    from redis.asyncio import ConnectionPool, Redis
+    from aiogram.fsm.storage.redis import RedisStorage
+    
+    # One shared pool so set_state/get_data calls reuse open connections
+    pool = ConnectionPool.from_url(Config.REDIS_URL, max_connections=Config.REDIS_MAX_CONNECTIONS)
+    return RedisStorage(redis=Redis(connection_pool=pool))
+
+async def on_error(event: ErrorEvent):
+    """Log any unhandled handler error and tell the user something went wrong"""
+    logger.error("Handler error: %s", event.exception, exc_info=event.exception)
+    update = event.update
+    text = "Произошла ошибка. Попробуйте еще раз."
+    # The error reply is best effort; a callback query that was already answered gets it in the chat instead
+    with suppress(Exception):
+        if update.callback_query:
+            try:
+                await update.callback_query.answer(text)
+            except Exception:
+                await update.callback_query.message.answer(text)
+        elif update.message:
+            await update.message.answer(text)
+
 async def main():
     """Main bot function"""
+    # Logging calls only put records on the queue and a listener thread writes them to stderr,
+    # so they never block the event loop on I/O
+    root_logger = logging.getLogger()
+    stream_handlers = root_logger.handlers
+    log_listener = QueueListener(_log_queue, *stream_handlers)
+    root_logger.handlers = [DroppingQueueHandler(_log_queue)]
+    log_listener.start()
     try:
         # Validate configuration
         Config.validate()
         logger.info("Configuration validated successfully")
         
         # Initialize bot and dispatcher
-        bot = Bot(token=Config.TELEGRAM_BOT_TOKEN)
-        dp = Dispatcher(storage=MemoryStorage())
+        # One pooled session sized so concurrent answer/edit_text calls don't queue on the default 100 connections
+        session = AiohttpSession(limit=Config.TELEGRAM_MAX_CONNECTIONS)
+        bot = Bot(token=Config.TELEGRAM_BOT_TOKEN, session=session)
+        # Throttle outgoing messages to stay under Telegram's per-chat and global limits
+        bot.session.middleware(RateLimitMiddleware())
+        dp = Dispatcher(storage=create_fsm_storage())
         
-        # Initialize Supabase client
+        # Initialize Supabase client once per process; its HTTP connection pool
+        # is shared by every handler
         supabase_client = SupabaseClient(
             supabase_url=Config.SUPABASE_URL,
             supabase_key=Config.SUPABASE_KEY
         )
         
-        # Add dependency injection for supabase client
-        dp.workflow_data.update(supabase_client=supabase_client)
+        # Inject the shared supabase client and notification scheduler into every handler via workflow data
+        dp["supabase_client"] = supabase_client
+        dp["notification_scheduler"] = NotificationScheduler(bot, supabase_client)
         
         # Include routers
         dp.include_router(start_router)
         dp.include_router(content_router)
         dp.include_router(question_router)
         dp.include_router(query_router)
+        ensure_unique_handlers(dp)
         
-        # Add middleware to inject supabase client
-        @dp.message.outer_middleware()
-        async def inject_supabase(handler, event, data):
-            data['supabase_client'] = supabase_client
-            return await handler(event, data)
-        
-        @dp.callback_query.outer_middleware()
-        async def inject_supabase_callback(handler, event, data):
-            data['supabase_client'] = supabase_client
-            return await handler(event, data)
+        # Central error handler for exceptions not caught inside handlers
+        dp.errors.register(on_error)
         
         logger.info("Bot initialized successfully")
         
-        # Start polling
-        await dp.start_polling(bot, allowed_updates=['message', 'callback_query'])
+        # Start polling; each update is handled in its own task so slow handlers don't serialize the rest
+        await dp.start_polling(bot, allowed_updates=['message', 'callback_query'], handle_as_tasks=True)
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
+    finally:
+        # Flush queued records and write directly again for whatever runs after the bot stops
+        log_listener.stop()
+        root_logger.handlers = stream_handlers
 
 if __name__ == "__main__":
     try:
@@ -67,4 +135,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
\ No newline at end of file
+        logger.error(f"Unexpected error: {e}")
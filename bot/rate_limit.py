@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Async token bucket: refills `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Bot session middleware that keeps outgoing chat messages within Telegram limits
+
+    Every method addressed to a chat waits for a token from its per-chat bucket
+    (about 1 msg/s with a small burst) and from the bot-wide bucket (30 msg/s).
+    A 429 response is retried once after the requested retry_after delay.
+    """
+
+    def __init__(self, global_rate: float = 28, per_chat_rate: float = 1, per_chat_burst: float = 3, max_chats: int = 10_000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_chats = max_chats
+        self._chat_buckets: OrderedDict = OrderedDict()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        """Get the bucket for a chat, evicting the least recently used one when full"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # Polling, callback answers, file downloads etc. are not chat messages
+            return await make_request(bot, method)
+
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            logger.warning("Flood control on %s in chat %s, retrying in %ss", type(method).__name__, chat_id, e.retry_after)
+            await asyncio.sleep(e.retry_after)
+            return await make_request(bot, method)
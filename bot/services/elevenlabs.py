@@ -5,6 +5,7 @@ All functionality in a single file
 """
 
 import argparse
+import logging
 import sys
 import os
 import requests
@@ -17,6 +18,8 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class TextToSpeechService:
     """
@@ -135,7 +138,7 @@ class TextToSpeechService:
             if not output_path.exists() or output_path.stat().st_size == 0:
                 raise Exception("Audio file was not created successfully")
             
-            print(f"Audio saved to: {output_path}")
+            logger.info("Audio saved to: %s", output_path)
             return str(output_path)
         
         except requests.exceptions.Timeout:
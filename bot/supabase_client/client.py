@@ -1,17 +1,38 @@
 import asyncio
+import time
 from typing import List, Optional, Dict, Any
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 from .models import User, NotificationSettings
 
+_USER_CACHE_TTL = 30
+_USER_CACHE_SIZE = 10_000
+# PostgREST error code for an rpc call to a function that doesn't exist
+_UNDEFINED_FUNCTION = 'PGRST202'
+
 class SupabaseClient:
     def __init__(self, supabase_url: str, supabase_key: str):
         self.client: Client = create_client(supabase_url, supabase_key)
+        # telegram_id -> (expires_at, user); writes through this client refresh the entry
+        self._user_cache: Dict[int, tuple] = {}
+    
+    def _cache_user(self, user: User):
+        """Remember a user row for a short while, dropping the oldest entry when full"""
+        self._user_cache.pop(user.telegram_id, None)
+        self._user_cache[user.telegram_id] = (time.monotonic() + _USER_CACHE_TTL, user)
+        if len(self._user_cache) > _USER_CACHE_SIZE:
+            del self._user_cache[next(iter(self._user_cache))]
     
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        cached = self._user_cache.get(telegram_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
         try:
             response = self.client.table('users').select('*').eq('telegram_id', telegram_id).execute()
             if response.data:
-                return User(**response.data[0])
+                user = User(**response.data[0])
+                self._cache_user(user)
+                return user
             return None
         except Exception as e:
             pass  # User error suppressed for performance
@@ -19,20 +40,23 @@ class SupabaseClient:
     
     async def create_or_update_user(self, user_data: Dict[str, Any]) -> Optional[User]:
         try:
-            existing_user = await self.get_user_by_telegram_id(user_data['telegram_id'])
-            
-            if existing_user:
-                response = self.client.table('users').update(user_data).eq('telegram_id', user_data['telegram_id']).execute()
-            else:
-                response = self.client.table('users').insert(user_data).execute()
+            # telegram_id is unique, so a single upsert replaces the lookup + update/insert pair
+            response = self.client.table('users').upsert(user_data, on_conflict='telegram_id').execute()
             
             if response.data:
-                return User(**response.data[0])
+                user = User(**response.data[0])
+                self._cache_user(user)
+                return user
+            self._user_cache.pop(user_data.get('telegram_id'), None)
             return None
         except Exception as e:
-            pass  # User creation error suppressed for performance
+            self._user_cache.pop(user_data.get('telegram_id'), None)
             return None
     
+    async def update_user_timezone(self, telegram_id: int, timezone: str) -> Optional[User]:
+        """Set a user's timezone (e.g. 'UTC+3')"""
+        return await self.create_or_update_user({'telegram_id': telegram_id, 'timezone': timezone})
+    
     async def search_content(self, user_id: int, query_embedding: List[float], limit: int = 5, threshold: float = 0.5) -> List[Dict[str, Any]]:
         """
         Vector similarity search engine for documents
@@ -275,11 +299,37 @@ class SupabaseClient:
             pass  # Notification settings update error suppressed for performance
             return None
     
+    async def set_user_notification(self, telegram_id: int, enabled: bool, settings: Dict[str, Any]) -> Optional[User]:
+        """Set a user's notification flag and settings in one round-trip, returning the updated user"""
+        try:
+            response = self.client.rpc('set_user_notification', {
+                'p_telegram_id': telegram_id,
+                'p_notification': enabled,
+                'p_settings': settings
+            }).execute()
+        except APIError as e:
+            # Only a database without the set_user_notification function falls back to writing the two tables separately
+            if e.code != _UNDEFINED_FUNCTION:
+                raise
+            user = await self.create_or_update_user({'telegram_id': telegram_id, 'notification': enabled})
+            if user:
+                await self.create_or_update_notification_settings(user.id, settings)
+            return user
+        
+        if response.data:
+            user = User(**response.data[0])
+            self._cache_user(user)
+            return user
+        self._user_cache.pop(telegram_id, None)
+        return None
+    
     async def get_users_for_notification(self, current_time: str, current_weekday: str) -> List[Dict[str, Any]]:
         """Get users who should receive notifications at current time and day"""
         try:
-            # Get users with notifications enabled
-            users_response = self.client.table('users').select('id, telegram_id, username').eq('notification', True).execute()
+            # Get users with notifications enabled together with their settings in one query
+            users_response = self.client.table('users').select(
+                'id, telegram_id, username, notification_settings(settings)'
+            ).eq('notification', True).execute()
             
             if not users_response.data:
                 return []
@@ -287,11 +337,8 @@ class SupabaseClient:
             users_to_notify = []
             
             for user in users_response.data:
-                # Get user's notification settings
-                settings_response = self.client.table('notification_settings').select('settings').eq('user_id', user['id']).execute()
-                
-                if settings_response.data:
-                    settings = settings_response.data[0]['settings']
+                if user.get('notification_settings'):
+                    settings = user['notification_settings'][0]['settings']
                     user_time = settings.get('time')
                     user_frequency = settings.get('frequency')
                     
@@ -106,6 +106,34 @@ BEGIN
 END;
 $$;
 
+-- Function to set a user's notification flag and settings in one call, returning the user row
+CREATE OR REPLACE FUNCTION set_user_notification(
+    p_telegram_id BIGINT,
+    p_notification BOOLEAN,
+    p_settings JSONB
+)
+RETURNS SETOF users
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user users%ROWTYPE;
+BEGIN
+    UPDATE users SET notification = p_notification
+    WHERE telegram_id = p_telegram_id
+    RETURNING * INTO v_user;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    UPDATE notification_settings SET settings = p_settings WHERE user_id = v_user.id;
+    IF NOT FOUND THEN
+        INSERT INTO notification_settings (user_id, settings) VALUES (v_user.id, p_settings);
+    END IF;
+
+    RETURN NEXT v_user;
+END;
+$$;
+
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
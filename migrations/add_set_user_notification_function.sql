@@ -0,0 +1,33 @@
+-- Migration: Add set_user_notification function
+-- Date: 2026-10-15
+-- Description: Save the notification flag and notification settings in a single RPC call
+
+CREATE OR REPLACE FUNCTION set_user_notification(
+    p_telegram_id BIGINT,
+    p_notification BOOLEAN,
+    p_settings JSONB
+)
+RETURNS SETOF users
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user users%ROWTYPE;
+BEGIN
+    UPDATE users SET notification = p_notification
+    WHERE telegram_id = p_telegram_id
+    RETURNING * INTO v_user;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    UPDATE notification_settings SET settings = p_settings WHERE user_id = v_user.id;
+    IF NOT FOUND THEN
+        INSERT INTO notification_settings (user_id, settings) VALUES (v_user.id, p_settings);
+    END IF;
+
+    RETURN NEXT v_user;
+END;
+$$;
+
+-- Verify the function was created
+SELECT proname FROM pg_proc WHERE proname = 'set_user_notification';
@@ -0,0 +1,50 @@
+"""
+Shared pieces for tests that feed updates through the bot's Dispatcher
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from unittest.mock import MagicMock
+
+from aiogram import Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update, User
+
+from bot.commands.commands import content_router, start_router
+
+USER_ID = 42
+
+
+class RecordingSession(BaseSession):
+    """Bot session that records API calls instead of sending them"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def dispatcher() -> Dispatcher:
+    """The Dispatcher shared by all tests; routers can only be attached once. Its supabase_client is a MagicMock"""
+    dp = Dispatcher()
+    dp.include_router(start_router)
+    dp.include_router(content_router)
+    dp["supabase_client"] = MagicMock()
+    return dp
+
+
+def message_update(text: str) -> Update:
+    """Build a private chat text message update"""
+    user = User(id=USER_ID, is_bot=False, first_name="Test")
+    chat = Chat(id=USER_ID, type="private")
+    return Update(update_id=1, message=Message(message_id=1, date=datetime.now(), chat=chat, from_user=user, text=text))
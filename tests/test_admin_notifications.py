@@ -0,0 +1,58 @@
+"""
+Check that questions queued for the admin survive a rejected batch and shutdown
+Run with: python -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendMessage
+
+import bot.commands.commands as commands
+from tests.dispatch import RecordingSession
+
+ADMIN_ID = 7
+
+
+class RejectingSession(RecordingSession):
+    """Records API calls and rejects any message that joins several questions"""
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if "\n\n" in method.text:
+            raise TelegramBadRequest(method=method, message="can't parse entities")
+        return True
+
+
+class AdminNotificationTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.multiple(commands, _ADMIN_ID=ADMIN_ID, _ADMIN_BATCH_WINDOW=0.01, _admin_queue=None)
+        patcher.start()
+        self.addAsyncCleanup(self.stop_worker)
+        self.addCleanup(patcher.stop)
+
+    async def stop_worker(self):
+        for task in list(commands._bg_tasks):
+            task.cancel()
+        await asyncio.gather(*commands._bg_tasks, return_exceptions=True)
+
+    async def test_rejected_batch_is_sent_one_by_one(self):
+        session = RejectingSession()
+        await commands._notify_admin(Bot(token="42:TEST", session=session), ["first", "second"])
+        sent = [method.text for method in session.calls if isinstance(method, SendMessage)]
+        self.assertEqual(sent, ["first\n\nsecond", "first", "second"])
+
+    async def test_shutdown_flushes_queue(self):
+        session = RecordingSession()
+        bot = Bot(token="42:TEST", session=session)
+        commands._queue_admin_notification(bot, "first")
+        commands._queue_admin_notification(bot, "second")
+        await commands.flush_admin_notifications()
+        self.assertEqual([method.text for method in session.calls], ["first\n\nsecond"])
+
+
+if __name__ == "__main__":
+    unittest.main()
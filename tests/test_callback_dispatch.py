@@ -0,0 +1,95 @@
+"""
+Feed real callback updates through the Dispatcher to check that handlers run end to end
+Run with: python -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import unittest
+from datetime import date, datetime
+from unittest.mock import AsyncMock
+
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from bot.commands.commands import BookCB, callback_prefix, callback_route
+from bot.supabase_client.models import User as DbUser
+from tests.dispatch import USER_ID, RecordingSession, dispatcher
+
+
+def callback_update(data: str) -> Update:
+    """Build a callback query update as Telegram would send it for a button press"""
+    user = User(id=USER_ID, is_bot=False, first_name="Test")
+    chat = Chat(id=USER_ID, type="private")
+    message = Message(message_id=1, date=datetime.now(), chat=chat, text="menu")
+    return Update(
+        update_id=1,
+        callback_query=CallbackQuery(id="1", from_user=user, chat_instance="1", data=data, message=message)
+    )
+
+
+class CallbackDispatchTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dp = dispatcher()
+        cls.supabase_client = cls.dp["supabase_client"]
+
+    def setUp(self):
+        self.session = RecordingSession()
+        self.bot = Bot(token="42:TEST", session=self.session)
+
+    async def feed(self, data: str) -> list[type]:
+        """Feed a callback update (handler errors propagate) and return the API method types called"""
+        await self.dp.feed_update(self.bot, callback_update(data))
+        return [type(method) for method in self.session.calls]
+
+    async def assert_answered_and_edited(self, data: str):
+        calls = await self.feed(data)
+        self.assertIn(AnswerCallbackQuery, calls)
+        self.assertIn(EditMessageText, calls)
+
+    async def test_static_response(self):
+        await self.assert_answered_and_edited("materials_videos")
+
+    async def test_notifications_on(self):
+        await self.assert_answered_and_edited("notifications_on")
+
+    async def test_booking_date(self):
+        day = date.today().toordinal() + 1
+        await self.assert_answered_and_edited(BookCB(day=day).pack())
+
+    async def test_booking_slot(self):
+        day = date.today().toordinal() + 1
+        await self.assert_answered_and_edited(BookCB(day=day, slot=0).pack())
+
+    async def test_manual_timezone_request(self):
+        await self.assert_answered_and_edited("tz_manual_input_daily")
+
+    async def test_location_request(self):
+        calls = await self.feed("tz_request_location_daily")
+        self.assertIn(AnswerCallbackQuery, calls)
+        self.assertIn(EditMessageText, calls)
+        self.assertIn(SendMessage, calls)
+
+    async def test_notifications_off_with_cached_user_saves_in_background(self):
+        self.supabase_client.get_user_by_telegram_id = AsyncMock(return_value=DbUser(telegram_id=USER_ID, notification=True))
+        self.supabase_client.set_user_notification = AsyncMock()
+        self.assertIn(EditMessageText, await self.feed("notifications_off"))
+        await asyncio.sleep(0)
+        self.supabase_client.set_user_notification.assert_awaited_once_with(USER_ID, False, {})
+
+    async def test_format_without_cached_user_waits_for_write(self):
+        self.supabase_client.get_user_by_telegram_id = AsyncMock(return_value=None)
+        self.supabase_client.create_or_update_user = AsyncMock(return_value=DbUser(telegram_id=USER_ID, isAudio=True))
+        self.assertIn(EditMessageText, await self.feed("format_audio"))
+        self.supabase_client.create_or_update_user.assert_awaited_once_with({'telegram_id': USER_ID, 'isAudio': True})
+
+    def test_duplicate_route_is_rejected(self):
+        with self.assertRaises(RuntimeError):
+            callback_route('back_to_settings')(lambda callback_query: None)
+        with self.assertRaises(RuntimeError):
+            callback_prefix('tz_')(lambda callback_query: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
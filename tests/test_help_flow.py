@@ -0,0 +1,47 @@
+"""
+Feed /help and follow-up messages through the Dispatcher to check which handler takes the next message
+Run with: python -m unittest discover -s tests -t .
+"""
+
+import unittest
+from unittest.mock import AsyncMock
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+from bot.commands.commands import NotificationStates
+from tests.dispatch import USER_ID, RecordingSession, dispatcher, message_update
+
+
+class HelpFlowTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dp = dispatcher()
+        cls.supabase_client = cls.dp["supabase_client"]
+
+    def setUp(self):
+        self.session = RecordingSession()
+        self.bot = Bot(token="42:TEST", session=self.session)
+
+    async def send(self, text: str):
+        """Feed a text message update (handler errors propagate)"""
+        await self.dp.feed_update(self.bot, message_update(text))
+
+    async def test_help_question_is_accepted(self):
+        await self.send("/help")
+        await self.send("my question")
+        replies = [method.text for method in self.session.calls if isinstance(method, SendMessage)]
+        self.assertTrue(replies[-1].startswith("Ваше сообщение принято"))
+
+    async def test_timezone_input_after_help_is_not_taken_as_question(self):
+        self.supabase_client.update_user_timezone = AsyncMock()
+        await self.send("/help")
+        # Another flow takes over the conversation by setting its own state
+        state = self.dp.fsm.get_context(self.bot, chat_id=USER_ID, user_id=USER_ID)
+        await state.set_state(NotificationStates.waiting_for_timezone_manual)
+        await self.send("UTC+3")
+        self.supabase_client.update_user_timezone.assert_awaited_once_with(USER_ID, "UTC+3")
+
+
+if __name__ == "__main__":
+    unittest.main()